@@ -1,15 +1,44 @@
-from collections import defaultdict, Counter
+import zlib
+from collections import defaultdict, Counter, namedtuple
+from itertools import repeat
+from operator import add, attrgetter, mul
+from statistics import median
+from matching_model import AttemptBatch
+
+# Report metrics of one course, or of all attempts for the totals row (course_name "total")
+CourseMetrics = namedtuple("CourseMetrics",
+    [
+        "course_name",
+        "attempts",
+        "unique_users",
+        "mean_attempts_per_user",
+        "median_attempts_per_user",
+        "runs",
+        "submits",
+        "correct_submits"
+    ])
+
+ReportMetrics = namedtuple("ReportMetrics", ["courses", "total"])
+
+TOTAL = "total"
 
 
 def get_unique_users(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.unique("user_id")
     return set(att.user_id for att in attempts)
 
 
 def get_unique_targets(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.unique("target_id")
     return set(att.target_id for att in attempts)
 
 
 def get_attempts_per_course(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.group_by("course_name")
+
     attempts_per_course = defaultdict(list)
 
     for att in attempts:
@@ -19,14 +48,228 @@ def get_attempts_per_course(attempts):
 
 
 def count_attempts_per_user(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.count("user_id")
     return Counter(att.user_id for att in attempts)
 
 
 def count_correctness(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.count("is_correct")
     return Counter(att.is_correct for att in attempts)
 
 
 def count_attempt_types(attempts):
+    if isinstance(attempts, AttemptBatch):
+        return attempts.count("attempt_type")
     return Counter(att.attempt_type for att in attempts)
 
 
+def compute_report_metrics(attempts):
+    """
+    Compute the per-course and total report metrics at once (see MetricsAccumulator).
+    Courses are listed in order of their first attempt. Returns ReportMetrics;
+    its total is None if there are no attempts.
+    """
+    accumulator = MetricsAccumulator()
+    accumulator.update(attempts)
+    return accumulator.finalize()
+
+
+class MetricsAccumulator:
+    """
+    Mergeable partial state of the report metrics.
+    Attempts are counted per (course, user), per (course, attempt type) and per course of
+    correct submits; every report metric is derived from these counters on finalize().
+    Accumulators built over shards, streamed batches or single days can be merged,
+    and their state can be stored with to_dict() and restored with from_dict().
+
+    With max_users set, per-user counts are only kept for a hash-based sample of users,
+    so memory stays bounded for huge user sets. The sample keeps every attempt of a sampled
+    user and is consistent across accumulators, so merging stays exact for the sampled users.
+    Unique users are then estimated by scaling, and mean and median are taken over the sample;
+    attempt, run, submit and correct submit counts stay exact.
+    """
+
+    def __init__(self, max_users=None):
+        self.max_users = max_users
+        # Users whose hash fraction is below the threshold are sampled; 1.0 keeps all users
+        self.threshold = 1.0
+        self.user_pairs = Counter()      # (course, user) -> attempts
+        self.user_totals = Counter()     # user -> attempts
+        self.type_pairs = Counter()      # (course, attempt type) -> attempts
+        self.correct = Counter()         # course -> correct submits
+
+    def update(self, attempts):
+        """
+        Add a batch of attempts: an AttemptBatch, a list of Attempt or any iterable of Attempt,
+        e.g. the generator of fetcher.iter_attempts, which is consumed in a single pass.
+        """
+        if isinstance(attempts, AttemptBatch):
+            user_pairs, type_pairs, correct = _count_batch(attempts)
+        elif not isinstance(attempts, (list, tuple)):
+            user_pairs = Counter()
+            type_pairs = Counter()
+            correct = Counter()
+            for att in attempts:
+                user_pairs[att.course_name, att.user_id] += 1
+                type_pairs[att.course_name, att.attempt_type] += 1
+                if att.is_correct == 1:
+                    correct[att.course_name] += 1
+        else:
+            # Counting over attrgetter keys runs in C, which beats one Python-level loop;
+            # attempt types and correctness share a pass keyed on a handful of distinct values
+            user_pairs = Counter(map(attrgetter("course_name", "user_id"), attempts))
+            type_pairs = Counter()
+            correct = Counter()
+            for (course, attempt_type, is_correct), n in Counter(
+                    map(attrgetter("course_name", "attempt_type", "is_correct"), attempts)).items():
+                type_pairs[course, attempt_type] += n
+                if is_correct == 1:
+                    correct[course] += n
+
+        self._add(user_pairs, type_pairs, correct)
+        return self
+
+    def merge(self, other):
+        """
+        Add the state of another accumulator. The sampling threshold of the result is the lower one.
+        """
+        if other.threshold < self.threshold:
+            self.threshold = other.threshold
+            self._drop_unsampled()
+        if self.max_users is None or (other.max_users is not None and other.max_users < self.max_users):
+            self.max_users = other.max_users
+        self._add(other.user_pairs, other.type_pairs, other.correct)
+        return self
+
+    def finalize(self):
+        """
+        Return ReportMetrics with the rows export_report renders.
+        """
+        if not self.type_pairs:
+            return ReportMetrics([], None)
+
+        attempts_per_user = defaultdict(list)
+        for (course, user), count in self.user_pairs.items():
+            attempts_per_user[course].append(count)
+
+        types = defaultdict(Counter)
+        total_types = Counter()
+        for (course, attempt_type), count in self.type_pairs.items():
+            types[course][attempt_type] += count
+            total_types[attempt_type] += count
+
+        courses = [
+            self._metrics(course, attempts_per_user[course], course_types, self.correct.get(course, 0))
+            for course, course_types in types.items()
+        ]
+        total = self._metrics(TOTAL, list(self.user_totals.values()), total_types, sum(self.correct.values()))
+        return ReportMetrics(courses, total)
+
+    @property
+    def approximate(self):
+        return self.threshold < 1.0
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            "max_users": self.max_users,
+            "threshold": self.threshold,
+            "user_pairs": [[course, user, n] for (course, user), n in self.user_pairs.items()],
+            "type_pairs": [[course, attempt_type, n] for (course, attempt_type), n in self.type_pairs.items()],
+            "correct": [[course, n] for course, n in self.correct.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        accumulator = cls(state["max_users"])
+        accumulator.threshold = state["threshold"]
+        accumulator._add(
+            {(course, user): n for course, user, n in state["user_pairs"]},
+            {(course, attempt_type): n for course, attempt_type, n in state["type_pairs"]},
+            {course: n for course, n in state["correct"]}
+        )
+        return accumulator
+
+    def _add(self, user_pairs, type_pairs, correct):
+        self.type_pairs.update(type_pairs)
+        self.correct.update(correct)
+
+        if self.approximate:
+            sampled = {user for user in {user for _, user in user_pairs}
+                       if _user_fraction(user) < self.threshold}
+            user_pairs = {key: n for key, n in user_pairs.items() if key[1] in sampled}
+
+        # Counter.update copies a mapping in C into an empty counter, so the first batch adds cheaply
+        self.user_pairs.update(user_pairs)
+        user_totals = self.user_totals
+        get_total = user_totals.get
+        for (course, user), n in user_pairs.items():
+            user_totals[user] = get_total(user, 0) + n
+
+        # Halve the sample until it fits max_users
+        while self.max_users is not None and len(self.user_totals) > self.max_users:
+            self.threshold /= 2
+            self._drop_unsampled()
+
+    def _drop_unsampled(self):
+        dropped = {user for user in self.user_totals if _user_fraction(user) >= self.threshold}
+        if not dropped:
+            return
+        for user in dropped:
+            del self.user_totals[user]
+        for key in [key for key in self.user_pairs if key[1] in dropped]:
+            del self.user_pairs[key]
+
+    def _metrics(self, course_name, attempts_per_user, attempt_types, correct_submits):
+        runs = attempt_types.get("run", 0)
+        submits = attempt_types.get("submit", 0)
+        if not attempts_per_user:
+            # No sampled users in this course
+            return CourseMetrics(course_name, runs + submits, 0, None, None, runs, submits, correct_submits)
+
+        return CourseMetrics(
+            course_name=course_name,
+            attempts=runs + submits,
+            unique_users=round(len(attempts_per_user) / self.threshold),
+            # Exact for ints like statistics.mean, without its Fraction arithmetic
+            mean_attempts_per_user=round(sum(attempts_per_user) / len(attempts_per_user), 2),
+            median_attempts_per_user=median(attempts_per_user),
+            runs=runs,
+            submits=submits,
+            correct_submits=correct_submits
+        )
+
+
+def _count_batch(batch):
+    # Count over the integer codes with (course, user) and (course, attempt type, is_correct) folded
+    # into single int keys, then decode the distinct keys only
+    course_codes = batch.codes["course_name"]
+    courses = batch.values["course_name"]
+    users = batch.values["user_id"]
+    types = batch.values["attempt_type"]
+
+    user_count = len(users)
+    pair_keys = Counter(map(add, map(mul, course_codes, repeat(user_count)), batch.codes["user_id"]))
+    user_pairs = {(courses[course], users[user]): n
+                  for (course, user), n in zip(map(divmod, pair_keys, repeat(user_count)), pair_keys.values())}
+
+    # is_correct is -1 (None), 0 or 1, so key + 1 splits into (course, type) and is_correct + 1
+    type_keys = map(add, map(mul, course_codes, repeat(len(types))), batch.codes["attempt_type"])
+    type_pairs = Counter()
+    correct = Counter()
+    for key, n in Counter(map(add, map(mul, type_keys, repeat(3)), batch.is_correct)).items():
+        key, is_correct = divmod(key + 1, 3)
+        course, attempt_type = divmod(key, len(types))
+        type_pairs[courses[course], types[attempt_type]] += n
+        if is_correct == 2:
+            correct[courses[course]] += n
+    return user_pairs, type_pairs, correct
+
+
+def _user_fraction(user):
+    # Stable across processes, unlike hash()
+    return zlib.crc32(str(user).encode("utf-8")) / 2 ** 32
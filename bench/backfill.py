@@ -0,0 +1,48 @@
+"""
+Backfill throughput: items/s of fetcher.get_data over a two-day window of the local stub API
+(tests/stub_api.py) for every chunk size and number of concurrent requests.
+
+    python -m bench.backfill [--chunk-hours 1,6,24] [--workers 1,4,8] [--latency 0.05]
+"""
+import time
+import argparse
+import datetime as dt
+import fetcher
+from tests.stub_api import StubApi, stub_items
+
+START = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+END = START + dt.timedelta(days=2) - dt.timedelta(microseconds=1)
+
+
+def measure(chunk_hours, max_workers, latency):
+    # Returns the items/s and the number of requests of one backfill
+    with StubApi(latency=latency) as api:
+        started = time.perf_counter()
+        attempts = fetcher.get_data(api.url, START, END, chunk=dt.timedelta(hours=chunk_hours),
+                                    max_workers=max_workers)
+        elapsed = time.perf_counter() - started
+
+    assert len(attempts) == len(stub_items(START, END))
+    return len(attempts) / elapsed, api.requests
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--chunk-hours", default="1,6,24", help="comma-separated chunk sizes in hours")
+    arg_parser.add_argument("--workers", default="1,4,8", help="comma-separated numbers of concurrent requests")
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub API waits per request")
+    args = arg_parser.parse_args()
+
+    # No cached responses and no retry waits
+    fetcher.CACHE_ENABLED = False
+    fetcher._client = fetcher.ApiClient(max_retries=0)
+
+    for chunk_hours in map(int, args.chunk_hours.split(",")):
+        for max_workers in map(int, args.workers.split(",")):
+            items_per_second, requests = measure(chunk_hours, max_workers, args.latency)
+            print(f"chunk {chunk_hours:>2}h  {max_workers} workers  {requests:>3} requests  "
+                  f"{items_per_second:>10,.0f} items/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Database load benchmark: rows/s of the COPY-based db.loader.bulk_insert_data against the
+executemany-based db.loader.insert_data on a local PostgreSQL.
+
+The database is the one configured in secret/db_secrets.env (or the DB_* environment variables)
+and is created and migrated like `python main.py migrate` does. Its attempts, dimension and
+rollup tables are TRUNCATED before every load, so point DB_NAME at a scratch database.
+
+    DB_NAME=sml-assessment-hub-bench python -m bench.db_load [--rows 10000,100000]
+"""
+import time
+import argparse
+from db.admin import db_create_if_not_exist, user_create_if_not_exist, schema_create_if_not_exists
+from db.config import USER_DB_CONFIG, SCHEMA_NAME
+from db.migrate import migrate
+from db.pool import connection
+from db.loader import insert_data, bulk_insert_data, DimensionCache
+from matching_model import AttemptBatch
+from bench.synthetic import make_attempts
+
+# Emptied before every load; clients and sync_state are kept
+TRUNCATED_TABLES = ("attempts", "attempts_daily_rollup", "users", "courses", "targets",
+                    "oauth_consumer_keys", "lis_result_sourcedids", "lis_outcome_service_urls")
+
+
+def truncate():
+    tables = ", ".join(f"{SCHEMA_NAME}.{table}" for table in TRUNCATED_TABLES)
+    with connection() as conn:
+        conn.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE;")
+
+
+def count_attempts():
+    with connection() as conn:
+        return conn.execute(f"SELECT count(*) FROM {SCHEMA_NAME}.attempts;").fetchone()[0]
+
+
+def measure(load, attempts):
+    # Returns the seconds of one load into empty tables
+    truncate()
+    started = time.perf_counter()
+    load(attempts)
+    elapsed = time.perf_counter() - started
+    assert count_attempts() == len(attempts)
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", default="10000,100000", help="comma-separated batch sizes")
+    args = arg_parser.parse_args()
+
+    print(f"Preparing database '{USER_DB_CONFIG['dbname']}'")
+    db_create_if_not_exist()
+    user_create_if_not_exist()
+    schema_create_if_not_exists()
+    migrate()
+
+    loaders = (
+        ("executemany (insert_data)", insert_data),
+        # A new cache per load, since the truncation invalidates the cached ids
+        ("COPY (bulk_insert_data)", lambda attempts: bulk_insert_data(attempts, dimensions=DimensionCache())),
+    )
+    for rows in map(int, args.rows.split(",")):
+        attempts = AttemptBatch(make_attempts(rows))
+        results = {}
+        for name, load in loaders:
+            elapsed = measure(load, attempts)
+            results[name] = elapsed
+            print(f"{rows:>9,} rows  {name:<26} {rows / elapsed:>10,.0f} rows/s")
+        executemany, copy = results.values()
+        print(f"{rows:>9,} rows  speedup {executemany / copy:.1f}x")
+    truncate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Report metrics benchmark: attempts/s of attempts_metrics.compute_report_metrics over a list of
+attempts and over an AttemptBatch, against the per-course passes export_report used to make.
+It fails if compute_report_metrics is slower than those passes or its rows differ from theirs.
+
+    python -m bench.report_metrics [--sizes 1000000,10000000] [--repeat 3]
+"""
+import gc
+import time
+import argparse
+from statistics import mean, median
+from attempts_metrics import (compute_report_metrics, get_attempts_per_course, count_attempts_per_user,
+                              count_attempt_types, count_correctness)
+from matching_model import AttemptBatch
+from bench.synthetic import make_attempts
+
+
+def per_course_metrics(attempts):
+    # The metrics loop of the original export_report: several passes per course, then again for the totals
+    rows = []
+    attempts_per_course = get_attempts_per_course(attempts)
+    for course, course_attempts in attempts_per_course.items():
+        attempts_per_user = count_attempts_per_user(course_attempts)
+        attempt_types = count_attempt_types(course_attempts)
+        correctness = count_correctness(course_attempts)
+        rows.append([course, len(course_attempts), len(attempts_per_user),
+                     round(mean(attempts_per_user.values()), 2), median(attempts_per_user.values()),
+                     attempt_types.get("run", 0), attempt_types.get("submit", 0), correctness.get(1, 0)])
+
+    total_attempts_per_user = count_attempts_per_user(attempts)
+    total_attempt_types = count_attempt_types(attempts)
+    correctness = count_correctness(attempts)
+    rows.append(["total", len(attempts), len(total_attempts_per_user),
+                 round(mean(total_attempts_per_user.values()), 2), median(total_attempts_per_user.values()),
+                 total_attempt_types.get("run", 0), total_attempt_types.get("submit", 0), correctness.get(1, 0)])
+    return rows
+
+
+def measure(compute, attempts, repeat):
+    # Best of repeat runs, in attempts/s
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        compute(attempts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(attempts) / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--sizes", default="1000000,10000000", help="comma-separated attempt counts")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    for size in map(int, args.sizes.split(",")):
+        print(f"Generating {size:,} attempts")
+        attempts = list(make_attempts(size, passback=False))
+        metrics = compute_report_metrics(attempts)
+        assert [list(course) for course in metrics.courses] + [list(metrics.total)] == per_course_metrics(attempts)
+        results = [
+            ("per-course passes, list", measure(per_course_metrics, attempts, args.repeat)),
+            ("compute_report_metrics, list", measure(compute_report_metrics, attempts, args.repeat)),
+        ]
+        batch = AttemptBatch(attempts)
+        del attempts
+        results.append(("compute_report_metrics, batch", measure(compute_report_metrics, batch, args.repeat)))
+        del batch
+
+        before = results[0][1]
+        for name, attempts_per_second in results:
+            print(f"{size:>11,} attempts  {name:<30} {attempts_per_second:>12,.0f} attempts/s, "
+                  f"{attempts_per_second / before:.2f}x")
+        for name, attempts_per_second in results[1:]:
+            assert attempts_per_second >= before, f"{name} is slower than the per-course passes"
+
+
+if __name__ == "__main__":
+    main()
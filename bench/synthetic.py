@@ -0,0 +1,92 @@
+import random
+import datetime as dt
+from matching_model import Attempt
+
+# Synthetic data shaped like the Simulative API data, shared by the benchmarks in this directory
+
+START = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+SERVICE_URL = "https://lms.skillfactory.ru/courses/course-v1:{course}/xblock/block-v1:{course}+type@lti+block@{target}/handler_noauth/grade_handler"
+
+# Kinds of invalid items mixed into a payload, in the proportions they are generated
+_INVALID_ITEMS = ("fields_mismatch", "invalid_attempt_type", "invalid_created_at", "invalid_passback",
+                  "user_id_mismatch")
+
+
+def course_names(count):
+    return [f"SkillFactory+COURSE-{n}+01JAN2026" for n in range(count)]
+
+
+def make_items(count, users=10_000, courses=20, targets=50, invalid_share=0.01, seed=0):
+    """
+    Return count raw items spread over a day from START, as the API returns them.
+    invalid_share of them are rejected by validation for one of the _INVALID_ITEMS reasons.
+    """
+    rng = random.Random(seed)
+    names = course_names(courses)
+    day_micros = 24 * 60 * 60 * 10 ** 6
+    items = []
+    for n in range(count):
+        user_id = f"{rng.randrange(users):032x}"
+        course = rng.choice(names)
+        target = f"{rng.randrange(targets):032x}"
+        attempt_type = "submit" if rng.random() < 0.6 else "run"
+        created_at = START + dt.timedelta(microseconds=rng.randrange(day_micros))
+        passback = {
+            "oauth_consumer_key": "",
+            "lis_result_sourcedid": f"course-v1:{course}:lms.skillfactory.ru-{target}:{user_id}",
+            "lis_outcome_service_url": SERVICE_URL.format(course=course, target=target),
+        }
+        item = {
+            "lti_user_id": user_id,
+            "passback_params": str(passback),
+            "attempt_type": attempt_type,
+            "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "is_correct": rng.choice((0, 1)) if attempt_type == "submit" else None,
+        }
+        if rng.random() < invalid_share:
+            _spoil(item, rng.choice(_INVALID_ITEMS))
+        items.append(item)
+    return items
+
+
+def make_attempts(count, users=10_000, courses=20, targets=50, seed=0, passback=True):
+    """
+    Yield count valid attempts spread over a day from START, without going through validation.
+    If passback is False, the raw passback fields are left empty, which keeps 10^7 attempts in memory.
+    """
+    rng = random.Random(seed)
+    names = course_names(courses)
+    # Validation turns the '+' of the raw course name into spaces
+    display_names = {name: name.replace("+", " ") for name in names}
+    user_ids = [f"{n:032x}" for n in range(users)]
+    target_ids = [f"{n:032x}" for n in range(targets)]
+    day_micros = 24 * 60 * 60 * 10 ** 6
+    for _ in range(count):
+        user_id = rng.choice(user_ids)
+        course = rng.choice(names)
+        target = rng.choice(target_ids)
+        attempt_type = "submit" if rng.random() < 0.6 else "run"
+        yield Attempt(
+            user_id=user_id,
+            created_at=START + dt.timedelta(microseconds=rng.randrange(day_micros)),
+            course_name=display_names[course],
+            target_id=target,
+            attempt_type=attempt_type,
+            is_correct=rng.choice((0, 1)) if attempt_type == "submit" else None,
+            raw_oauth_consumer_key="" if passback else None,
+            raw_lis_result_sourcedid=f"course-v1:{course}:lms.skillfactory.ru-{target}:{user_id}" if passback else None,
+            raw_lis_outcome_service_url=SERVICE_URL.format(course=course, target=target) if passback else None,
+        )
+
+
+def _spoil(item, kind):
+    if kind == "fields_mismatch":
+        del item["is_correct"]
+    elif kind == "invalid_attempt_type":
+        item["attempt_type"] = "check"
+    elif kind == "invalid_created_at":
+        item["created_at"] = "yesterday"
+    elif kind == "invalid_passback":
+        item["passback_params"] = "{'oauth_consumer_key': "
+    elif kind == "user_id_mismatch":
+        item["lti_user_id"] = "0" * 32
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of item validation: items/s of matching_model.validate_item against the
+validation of the original get_attempt (dateutil, json.loads and per-item sets) over a synthetic payload.
+
+    python -m bench.validation [--items 1000000] [--repeat 3]
+"""
+import re
+import json
+import time
+import argparse
+import datetime as dt
+from dateutil import parser
+import matching_model
+from bench.synthetic import make_items
+
+
+def legacy_get_attempt(data_item):
+    # The checks of the original get_attempt, without its logging
+    if not isinstance(data_item, dict):
+        return None
+    if set(data_item.keys()) != set(matching_model.EXPECTED_RAW_DATA_FIELDS):
+        return None
+    user_id = data_item["lti_user_id"]
+    if not isinstance(user_id, str) or len(user_id) == 0:
+        return None
+    attempt_type = data_item["attempt_type"]
+    if attempt_type not in {"submit", "run"}:
+        return None
+    is_correct = data_item["is_correct"]
+    if is_correct not in {None, 0, 1}:
+        return None
+    try:
+        created_at = parser.parse(data_item["created_at"]).replace(tzinfo=dt.timezone.utc)
+    except (ValueError, TypeError):
+        return None
+    try:
+        raw_passback = data_item["passback_params"]
+        if not isinstance(raw_passback, str):
+            return None
+        passback_params = json.loads(raw_passback.replace("'", '"'))
+        if not isinstance(passback_params, dict):
+            return None
+    except json.JSONDecodeError:
+        return None
+    passback_params_fields = set(passback_params.keys())
+    if passback_params_fields != set(matching_model.EXPECTED_RAW_PASSBACK_PARAMS_FIELDS):
+        for absent_param in set(matching_model.EXPECTED_RAW_PASSBACK_PARAMS_FIELDS).difference(passback_params_fields):
+            passback_params[absent_param] = matching_model.ABSENT
+    lis_result_sourcedid = passback_params.get("lis_result_sourcedid")
+    match = re.match(matching_model.PASSBACK_LIS_RESULT_SOURCEDID_PATTERN, lis_result_sourcedid) \
+        if isinstance(lis_result_sourcedid, str) else None
+    if match:
+        if user_id != match.group("user_id"):
+            return None
+        course_name = match.group("course").replace("+", " ")
+        target_id = match.group("target_id")
+    else:
+        course_name = matching_model.UNKNOWN
+        target_id = lis_result_sourcedid
+    return matching_model.Attempt(
+        user_id, created_at, course_name, target_id, attempt_type, is_correct,
+        passback_params.get("oauth_consumer_key"), lis_result_sourcedid,
+        passback_params.get("lis_outcome_service_url"))
+
+
+def current_get_attempt(data_item):
+    return matching_model.validate_item(data_item)[0]
+
+
+def measure(validate, items, repeat):
+    # Best of repeat runs, in items/s
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        valid = sum(1 for item in items if validate(item))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best, valid
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--items", type=int, default=1_000_000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--invalid-share", type=float, default=0.01)
+    args = arg_parser.parse_args()
+
+    print(f"Generating {args.items:,} items, {args.invalid_share:.1%} invalid")
+    items = make_items(args.items, invalid_share=args.invalid_share)
+
+    results = {}
+    for name, validate in (("before (get_attempt)", legacy_get_attempt), ("after (validate_item)", current_get_attempt)):
+        items_per_second, valid = measure(validate, items, args.repeat)
+        results[name] = items_per_second
+        print(f"{name:<24} {items_per_second:>12,.0f} items/s, {valid:,} valid")
+
+    before, after = results.values()
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Scaling of parallel validation (fetcher.validate_items over a process pool) with the number of workers.
+
+    python -m bench.validation_scaling [--items 1000000] [--workers 1,2,4,8] [--batch-size 10000]
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import fetcher
+from bench.synthetic import make_items
+
+
+def measure(items, workers, batch_size):
+    # Returns the seconds to validate items, including the start of the worker processes
+    stats = {"items": 0, "failed": 0, "attempts": 0}
+    started = time.perf_counter()
+    if workers is None:
+        attempts = sum(1 for _ in fetcher.validate_items(items, stats))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=fetcher._init_validation_worker) as pool:
+            attempts = sum(1 for _ in fetcher.validate_items(items, stats, pool, batch_size,
+                                                              max_pending=2 * workers))
+    elapsed = time.perf_counter() - started
+    assert attempts == stats["attempts"] and stats["items"] == len(items)
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--items", type=int, default=1_000_000)
+    arg_parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    arg_parser.add_argument("--batch-size", type=int, default=fetcher.VALIDATION_BATCH_SIZE)
+    args = arg_parser.parse_args()
+
+    print(f"Generating {args.items:,} items; {os.cpu_count()} CPUs available")
+    items = make_items(args.items)
+
+    serial = measure(items, None, args.batch_size)
+    print(f"{'serial':<10} {len(items) / serial:>12,.0f} items/s")
+    for workers in map(int, args.workers.split(",")):
+        elapsed = measure(items, workers, args.batch_size)
+        print(f"{f'{workers} workers':<10} {len(items) / elapsed:>12,.0f} items/s, "
+              f"speedup {serial / elapsed:.2f}x over serial")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import psycopg
 from psycopg import sql
 from logger import get_general_logger
-from db.config import ADMIN_POSTGRES_CONFIG, ADMIN_DB_CONFIG, USER_DB_CONFIG, SCHEMA_NAME
+from db.config import ADMIN_POSTGRES_CONFIG, USER_DB_CONFIG, SCHEMA_NAME
+from db.pool import connection
 
 log = get_general_logger(__name__)
 
@@ -10,7 +11,7 @@ def db_create_if_not_exist():
     """
     Create the database if it does not already exist.
     """
-    with psycopg.connect(**ADMIN_POSTGRES_CONFIG, autocommit=True) as conn:
+    with connection("admin_postgres") as conn:
         try:
             with conn.cursor() as cur:
                 cur.execute(
@@ -41,7 +42,7 @@ def user_create_if_not_exist():
     Create the user if it does not already exist.
     """
     try:
-        with psycopg.connect(**ADMIN_POSTGRES_CONFIG, autocommit=True) as conn:
+        with connection("admin_postgres") as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     sql.SQL("SELECT 1 FROM pg_roles WHERE rolname = {};").format(
@@ -74,7 +75,7 @@ def schema_create_if_not_exists():
     specified in USER_DB_CONFIG["user"].
     """
     try:
-        with psycopg.connect(**ADMIN_DB_CONFIG, autocommit=True) as conn:
+        with connection("admin") as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     sql.SQL("SELECT 1 FROM information_schema.schemata WHERE schema_name = {};").format(
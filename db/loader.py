@@ -1,37 +1,68 @@
+import os
+import json
 import psycopg
 from logger import get_general_logger
 from db.config import USER_DB_CONFIG, SCHEMA_NAME
+from db.pool import connection
 from secret.client_settings import CLIENT
 
 log = get_general_logger(__name__)
 
+# Dimension id cache used by bulk_insert_data.
+# Warming loads all known ids once per process; persisting keeps them between runs.
+DIMENSION_CACHE_WARM = False
+DIMENSION_CACHE_PERSIST = False
+DIMENSION_CACHE_FILE = os.path.join("cache", "dimensions.json")
+
+# Adds the attempts of {source} to the daily rollup (see db/migrations/0004_attempts_daily_rollup.sql).
+# Only newly inserted attempts may be passed, since the counts are summed onto the existing rows;
+# the rows are upserted in key order, so concurrent loads lock shared rows in the same order.
+ROLLUP_UPSERT = """
+    INSERT INTO {schema}.attempts_daily_rollup AS r (
+        day, course_id, user_id, attempts, runs, submits, correct_submits
+    )
+    SELECT
+        (created_at AT TIME ZONE 'UTC')::date,
+        course_id,
+        user_id,
+        count(*),
+        count(*) FILTER (WHERE attempt_type = 'run'),
+        count(*) FILTER (WHERE attempt_type = 'submit'),
+        count(*) FILTER (WHERE is_correct = 1)
+    FROM {source}
+    WHERE course_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (day, course_id, user_id) DO UPDATE
+    SET attempts = r.attempts + EXCLUDED.attempts,
+        runs = r.runs + EXCLUDED.runs,
+        submits = r.submits + EXCLUDED.submits,
+        correct_submits = r.correct_submits + EXCLUDED.correct_submits
+"""
+
 
 def insert_data(attempts):
     """
     Inserts the data to the database specified in USER_DB_CONFIG["dbname"].
-    See db/schema.sql for schema structure.
+    See db/migrations for schema structure.
     """
     try:
-        with psycopg.connect(**USER_DB_CONFIG, autocommit=True) as conn:
+        with connection(autocommit=True) as conn:
             with conn.cursor() as cur:
-                # Insert CLIENT in Clients table once
-                cur.execute(f"""
-                    INSERT INTO {SCHEMA_NAME}.clients (name)
-                    VALUES (%s)
-                    ON CONFLICT (name) DO NOTHING;
-                """, (CLIENT,))
-
-                # get CLIENTs' id
-                cur.execute(
-                    f"SELECT id FROM {SCHEMA_NAME}.clients WHERE name = %s;",
-                    (CLIENT,)
-                )
-                client_id = cur.fetchone()[0]
+                client_id = _get_client_id(cur)
 
                 # Collect unique courses, users and targets to insert them in one batch each.
                 courses = {(att.course_name, client_id) for att in attempts}
                 users = {(att.user_id, ) for att in attempts}
                 targets = {(att.target_id, ) for att in attempts}
+                passback_values = {
+                    table: {(value, ) for value in values if value is not None}
+                    for table, values in (
+                        ("oauth_consumer_keys", {att.raw_oauth_consumer_key for att in attempts}),
+                        ("lis_result_sourcedids", {att.raw_lis_result_sourcedid for att in attempts}),
+                        ("lis_outcome_service_urls", {att.raw_lis_outcome_service_url for att in attempts}),
+                    )
+                }
 
                 # Insert all courses
                 cur.executemany(
@@ -63,7 +94,19 @@ def insert_data(attempts):
                     list(targets)
                 )
 
+                # Insert all passback values
+                for table, values in passback_values.items():
+                    cur.executemany(
+                        f"""
+                            INSERT INTO {SCHEMA_NAME}.{table} (value)
+                            VALUES (%s)
+                            ON CONFLICT (value) DO NOTHING;
+                        """,
+                        list(values)
+                    )
+
                 # Attempts table
+                _ensure_partitions(cur, attempts)
                 cur.executemany(f"""
                     INSERT INTO {SCHEMA_NAME}.attempts (
                         created_at, 
@@ -72,23 +115,28 @@ def insert_data(attempts):
                         target_id,
                         attempt_type, 
                         is_correct,
-                        raw_oauth_consumer_key,
-                        raw_lis_result_sourcedid,
-                        raw_lis_outcome_service_url
+                        oauth_consumer_key_id,
+                        lis_result_sourcedid_id,
+                        lis_outcome_service_url_id
                         )
                     VALUES (
                         %s,
                         (SELECT id FROM {SCHEMA_NAME}.users WHERE external_id = %s),
-                        (SELECT id FROM {SCHEMA_NAME}.courses WHERE name = %s),
+                        (SELECT id FROM {SCHEMA_NAME}.courses WHERE name = %s AND client_id = %s),
                         (SELECT id FROM {SCHEMA_NAME}.targets WHERE external_id = %s),
-                        %s, %s, %s, %s, %s
+                        %s, %s,
+                        (SELECT id FROM {SCHEMA_NAME}.oauth_consumer_keys WHERE value = %s),
+                        (SELECT id FROM {SCHEMA_NAME}.lis_result_sourcedids WHERE value = %s),
+                        (SELECT id FROM {SCHEMA_NAME}.lis_outcome_service_urls WHERE value = %s)
                     )
-                    ON CONFLICT (user_id, created_at, raw_lis_result_sourcedid) DO NOTHING;
+                    ON CONFLICT (user_id, created_at, lis_result_sourcedid_id) DO NOTHING
+                    RETURNING created_at, course_id, user_id, attempt_type, is_correct;
                 """,
                     (
                         (att.created_at,
                         att.user_id,
                         att.course_name,
+                        client_id,
                         att.target_id,
                         att.attempt_type,
                         att.is_correct,
@@ -96,11 +144,486 @@ def insert_data(attempts):
                         att.raw_lis_result_sourcedid,
                         att.raw_lis_outcome_service_url)
                         for att in attempts
-                    )
+                    ),
+                    returning=True
                 )
 
+                # One result per attempt; skipped duplicates return no row
+                inserted = []
+                while True:
+                    inserted.extend(cur.fetchall())
+                    if not cur.nextset():
+                        break
+                _add_to_daily_rollup(cur, inserted)
+
                 log.info(f"Attempts successfully processed into the database")
 
     except psycopg.Error as e:
         log.error(f"Error inserting data: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def bulk_insert_data(attempts, dimensions=None, advance_watermark=False, watermark=None,
+                     rejected=None, window=None, replayed_ids=None):
+    """
+    Bulk variant of insert_data for large batches.
+    User, course and target ids and the ids of the passback values are resolved through
+    the dimension cache (see DimensionCache),
+    the attempts are streamed with COPY into a temporary staging table carrying only integer
+    foreign keys and inserted with a single INSERT ... SELECT. Everything runs in one transaction
+    on a connection of the shared pool (see db/pool.py); the per-batch statements are prepared,
+    so repeated loads, e.g. by the pipeline, skip their parsing and planning.
+    If advance_watermark is True, the client's sync watermark is moved to watermark, the end of
+    the completely fetched window the attempts come from, in the same transaction (see get_watermark).
+    The API doesn't return items in created_at order, so the latest created_at of the attempts
+    is not a safe watermark: a part of the window may be missing.
+    The (reason, item) pairs of rejected items of the fetch window (start, end) are quarantined
+    in the rejected_items table in the same transaction, and the rejected_items rows with
+    replayed_ids, which the attempts were recovered from, are deleted (see iter_rejected_items).
+    """
+    if rejected and window is None:
+        raise ValueError("The fetch window is required to quarantine rejected items")
+    if advance_watermark and watermark is None:
+        raise ValueError("The end of the fetched window is required to advance the watermark")
+    if dimensions is None:
+        dimensions = get_dimension_cache()
+
+    committed = False
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                client_id = _get_client_id(cur)
+                if DIMENSION_CACHE_WARM and not dimensions.warmed:
+                    dimensions.warm(cur, client_id)
+
+                user_ids = dimensions.resolve(cur, "users", {att.user_id for att in attempts})
+                course_ids = dimensions.resolve(cur, "courses", {att.course_name for att in attempts}, client_id)
+                target_ids = dimensions.resolve(cur, "targets", {att.target_id for att in attempts})
+                consumer_key_ids = dimensions.resolve(
+                    cur, "consumer_keys", {att.raw_oauth_consumer_key for att in attempts})
+                sourcedid_ids = dimensions.resolve(
+                    cur, "sourcedids", {att.raw_lis_result_sourcedid for att in attempts})
+                service_url_ids = dimensions.resolve(
+                    cur, "service_urls", {att.raw_lis_outcome_service_url for att in attempts})
+
+                _ensure_partitions(cur, attempts)
+
+                cur.execute("""
+                    CREATE TEMP TABLE attempts_staging (
+                        created_at TIMESTAMPTZ,
+                        user_id BIGINT,
+                        course_id BIGINT,
+                        target_id BIGINT,
+                        attempt_type TEXT,
+                        is_correct SMALLINT,
+                        oauth_consumer_key_id INTEGER,
+                        lis_result_sourcedid_id BIGINT,
+                        lis_outcome_service_url_id INTEGER
+                    ) ON COMMIT DROP;
+                """)
+                with cur.copy("COPY attempts_staging FROM STDIN") as copy:
+                    for att in attempts:
+                        copy.write_row((
+                            att.created_at,
+                            user_ids[att.user_id],
+                            course_ids.get(att.course_name),
+                            target_ids.get(att.target_id),
+                            att.attempt_type,
+                            att.is_correct,
+                            consumer_key_ids.get(att.raw_oauth_consumer_key),
+                            sourcedid_ids[att.raw_lis_result_sourcedid],
+                            service_url_ids.get(att.raw_lis_outcome_service_url)
+                        ))
+
+                # The rollup is incremented with the rows actually inserted, so duplicates aren't counted twice
+                rollup_upsert = ROLLUP_UPSERT.format(schema=SCHEMA_NAME, source="inserted")
+                cur.execute(f"""
+                    WITH inserted AS (
+                        INSERT INTO {SCHEMA_NAME}.attempts (
+                            created_at,
+                            user_id,
+                            course_id,
+                            target_id,
+                            attempt_type,
+                            is_correct,
+                            oauth_consumer_key_id,
+                            lis_result_sourcedid_id,
+                            lis_outcome_service_url_id
+                            )
+                        SELECT * FROM attempts_staging
+                        ON CONFLICT (user_id, created_at, lis_result_sourcedid_id) DO NOTHING
+                        RETURNING created_at, course_id, user_id, attempt_type, is_correct
+                    ),
+                    rollup AS ({rollup_upsert})
+                    SELECT count(*) FROM inserted;
+                """)
+                inserted = cur.fetchone()[0]
+
+                log.info(f"{inserted} new attempts inserted, {len(attempts) - inserted} already in the database")
+
+                if rejected:
+                    _quarantine(cur, client_id, rejected, window)
+                if replayed_ids:
+                    cur.execute(f"DELETE FROM {SCHEMA_NAME}.rejected_items WHERE id = ANY(%s);", (replayed_ids,))
+                    log.info(f"{cur.rowcount} replayed items removed from quarantine")
+
+                if advance_watermark:
+                    _advance_watermark(cur, client_id, watermark)
+        committed = True
+
+    except psycopg.Error as e:
+        log.error(f"Error inserting data: {e}")
+        raise
+    finally:
+        # Ids handed out by a rolled back transaction must not stay in the cache
+        if committed:
+            dimensions.commit()
+        else:
+            dimensions.rollback()
+
+    if DIMENSION_CACHE_PERSIST:
+        dimensions.save(DIMENSION_CACHE_FILE)
+
+
+def set_watermark(watermark):
+    """
+    Advance the client's sync watermark to watermark without loading anything,
+    for a window that was fetched completely but contained no items.
+    """
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                _advance_watermark(cur, _get_client_id(cur), watermark)
+
+    except psycopg.Error as e:
+        log.error(f"Error advancing sync watermark: {e}")
+        raise
+
+
+def get_watermark():
+    """
+    Return the sync watermark of CLIENT: the end of the last completely fetched window an
+    incremental sync loaded (sync_state.synced_until, see db/migrations/0008_rename_sync_watermark.sql),
+    or None if the client has not been synced yet. It is not the created_at of any loaded attempt.
+    """
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT s.synced_until
+                    FROM {SCHEMA_NAME}.sync_state s
+                    JOIN {SCHEMA_NAME}.clients c ON c.id = s.client_id
+                    WHERE c.name = %s;
+                """, (CLIENT,))
+                row = cur.fetchone()
+                return row[0] if row else None
+
+    except psycopg.Error as e:
+        log.error(f"Error reading sync watermark: {e}")
+        raise
+
+
+def refresh_daily_rollup(start_day, end_day):
+    """
+    Rebuild the daily report rollup of the UTC days [start_day, end_day] from the attempts.
+    Loads keep the rollup up to date incrementally; this is the explicitly scheduled repair,
+    e.g. after attempts were deleted (see db/migrations/0007_incremental_daily_rollup.sql).
+    """
+    try:
+        with connection() as conn:
+            conn.execute(f"SELECT {SCHEMA_NAME}.refresh_attempts_daily_rollup(%s, %s);", (start_day, end_day))
+        log.info(f"Daily rollup rebuilt for {start_day} - {end_day}")
+
+    except psycopg.Error as e:
+        log.error(f"Error refreshing daily rollup: {e}")
+        raise
+
+
+def iter_rejected_items(batch_size, reason=None):
+    """
+    Yield the quarantined items of CLIENT, optionally only those with reason,
+    as lists of up to batch_size (id, reason, item) tuples in id order.
+    Every batch is read in its own short transaction, so the rows of a batch
+    can be deleted before the next one is read.
+    """
+    last_id = 0
+    while True:
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"""
+                        SELECT r.id, r.reason, r.item
+                        FROM {SCHEMA_NAME}.rejected_items r
+                        JOIN {SCHEMA_NAME}.clients c ON c.id = r.client_id
+                        WHERE c.name = %s AND r.id > %s AND (%s::text IS NULL OR r.reason = %s)
+                        ORDER BY r.id
+                        LIMIT %s;
+                    """, (CLIENT, last_id, reason, reason, batch_size), prepare=True)
+                    rows = cur.fetchall()
+
+        except psycopg.Error as e:
+            log.error(f"Error reading quarantined items: {e}")
+            raise
+
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+class DimensionCache:
+    """
+    In-process map of dimension keys to database ids for users, courses, targets
+    and the passback values (see db/migrations/0005_passback_lookup_tables.sql).
+    Unknown keys are inserted with INSERT ... ON CONFLICT DO NOTHING RETURNING id, and the ids
+    of keys that already existed are fetched with one select, so every key costs the database
+    one lookup per process. Courses are scoped by client id.
+    Keys added since the last commit() are dropped by rollback(), since their ids may belong
+    to rows of a rolled back transaction.
+    """
+
+    # dimension -> (table, key column, scope column)
+    DIMENSIONS = {
+        "users": ("users", "external_id", None),
+        "courses": ("courses", "name", "client_id"),
+        "targets": ("targets", "external_id", None),
+        "consumer_keys": ("oauth_consumer_keys", "value", None),
+        "sourcedids": ("lis_result_sourcedids", "value", None),
+        "service_urls": ("lis_outcome_service_urls", "value", None),
+    }
+    # Sourcedids grow with every new user and target, so warming doesn't load all of them
+    WARM_SKIP = {"sourcedids"}
+
+    def __init__(self):
+        # (dimension, scope) -> {key: id}
+        self.ids = {}
+        self.warmed = False
+        self._pending = []
+
+    def resolve(self, cur, dimension, keys, scope=None):
+        """
+        Return the {key: id} map of the dimension (within scope), making sure it contains all keys.
+        None keys are skipped.
+        """
+        ids = self.ids.setdefault((dimension, scope), {})
+        missing = [key for key in keys if key is not None and key not in ids]
+        if not missing:
+            return ids
+
+        table, key_column, scope_column = self.DIMENSIONS[dimension]
+        if scope_column:
+            cur.execute(f"""
+                INSERT INTO {SCHEMA_NAME}.{table} ({key_column}, {scope_column})
+                SELECT unnest(%s::text[]), %s
+                ON CONFLICT ({key_column}, {scope_column}) DO NOTHING
+                RETURNING {key_column}, id;
+            """, (missing, scope), prepare=True)
+        else:
+            cur.execute(f"""
+                INSERT INTO {SCHEMA_NAME}.{table} ({key_column})
+                SELECT unnest(%s::text[])
+                ON CONFLICT ({key_column}) DO NOTHING
+                RETURNING {key_column}, id;
+            """, (missing,), prepare=True)
+        self._add(dimension, scope, ids, cur.fetchall())
+
+        # Keys that were already in the table are not returned by the insert
+        existing = [key for key in missing if key not in ids]
+        if existing:
+            if scope_column:
+                cur.execute(
+                    f"SELECT {key_column}, id FROM {SCHEMA_NAME}.{table} WHERE {key_column} = ANY(%s) AND {scope_column} = %s;",
+                    (existing, scope),
+                    prepare=True
+                )
+            else:
+                cur.execute(
+                    f"SELECT {key_column}, id FROM {SCHEMA_NAME}.{table} WHERE {key_column} = ANY(%s);",
+                    (existing,),
+                    prepare=True
+                )
+            self._add(dimension, scope, ids, cur.fetchall())
+
+        return ids
+
+    def warm(self, cur, client_id):
+        """
+        Load all known users, targets and passback values except sourcedids, and the courses of the client.
+        """
+        for dimension, (table, key_column, scope_column) in self.DIMENSIONS.items():
+            if dimension in self.WARM_SKIP:
+                continue
+            if scope_column:
+                cur.execute(f"SELECT {key_column}, id FROM {SCHEMA_NAME}.{table} WHERE {scope_column} = %s;", (client_id,))
+                scope = client_id
+            else:
+                cur.execute(f"SELECT {key_column}, id FROM {SCHEMA_NAME}.{table};")
+                scope = None
+            self.ids.setdefault((dimension, scope), {}).update(cur.fetchall())
+        self.warmed = True
+        log.info(f"Dimension cache warmed: {sum(len(ids) for ids in self.ids.values())} keys")
+
+    def commit(self):
+        self._pending.clear()
+
+    def rollback(self):
+        for dimension, scope, key in self._pending:
+            self.ids[(dimension, scope)].pop(key, None)
+        self._pending.clear()
+
+    def save(self, path):
+        """
+        Persist the map to a JSON file. Ids are only valid for the database they were read from,
+        so the file is bound to the database and schema names.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        rows = [[dimension, scope, key, id_]
+                for (dimension, scope), ids in self.ids.items()
+                for key, id_ in ids.items()]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"database": _database_tag(), "rows": rows}, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read dimension cache {path}: {e}")
+            return
+
+        if data.get("database") != _database_tag():
+            log.warning(f"Dimension cache {path} belongs to another database, ignored")
+            return
+        for dimension, scope, key, id_ in data["rows"]:
+            self.ids.setdefault((dimension, scope), {})[key] = id_
+        log.info(f"Dimension cache loaded from {path}: {len(data['rows'])} keys")
+
+    def _add(self, dimension, scope, ids, rows):
+        for key, id_ in rows:
+            ids[key] = id_
+            self._pending.append((dimension, scope, key))
+
+
+_dimension_cache = None
+
+
+def get_dimension_cache():
+    """
+    Return the process-wide DimensionCache, loading the persisted one if persistence is on.
+    """
+    global _dimension_cache
+    if _dimension_cache is None:
+        _dimension_cache = DimensionCache()
+        if DIMENSION_CACHE_PERSIST:
+            _dimension_cache.load(DIMENSION_CACHE_FILE)
+    return _dimension_cache
+
+
+def _database_tag():
+    return f"{USER_DB_CONFIG['host']}:{USER_DB_CONFIG['port']}/{USER_DB_CONFIG['dbname']}/{SCHEMA_NAME}"
+
+
+def _ensure_partitions(cur, attempts):
+    """
+    Create the attempts partitions needed for the created_at range of the attempts.
+    """
+    if not attempts:
+        return
+    cur.execute(
+        f"SELECT {SCHEMA_NAME}.ensure_attempts_partitions(%s, %s);",
+        (min(att.created_at for att in attempts), max(att.created_at for att in attempts)),
+        prepare=True
+    )
+
+
+def _add_to_daily_rollup(cur, rows):
+    """
+    Add the (created_at, course_id, user_id, attempt_type, is_correct) rows of newly inserted
+    attempts to the daily report rollup.
+    """
+    if not rows:
+        return
+    source = """
+        unnest(%s::timestamptz[], %s::bigint[], %s::bigint[], %s::text[], %s::smallint[])
+            AS inserted (created_at, course_id, user_id, attempt_type, is_correct)
+    """
+    cur.execute(ROLLUP_UPSERT.format(schema=SCHEMA_NAME, source=source), [list(column) for column in zip(*rows)])
+
+
+def _quarantine(cur, client_id, rejected, window):
+    """
+    Load the (reason, item) pairs of rejected items into rejected_items with COPY.
+    Items already quarantined for the same reason are skipped.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE rejected_staging (
+            reason TEXT,
+            item JSONB
+        ) ON COMMIT DROP;
+    """)
+    with cur.copy("COPY rejected_staging FROM STDIN") as copy:
+        for reason, item in rejected:
+            copy.write_row((reason, _jsonb_text(item)))
+
+    window_start, window_end = window
+    cur.execute(f"""
+        INSERT INTO {SCHEMA_NAME}.rejected_items (client_id, reason, window_start, window_end, item)
+        SELECT %s, reason, %s, %s, item FROM rejected_staging
+        ON CONFLICT (client_id, reason, md5(item::text)) DO NOTHING;
+    """, (client_id, window_start, window_end))
+    log.info(f"{cur.rowcount} rejected items quarantined, {len(rejected) - cur.rowcount} already in quarantine")
+
+
+def _jsonb_text(item):
+    """
+    Return the JSON text of a raw item for a JSONB column.
+    JSONB rejects the \\u0000 escape, so NUL characters in keys and strings are stored as the
+    visible text '\\u0000' instead of failing the whole load of the window.
+    """
+    text = json.dumps(item, ensure_ascii=False, default=str)
+    if "\\u0000" in text:
+        text = json.dumps(_escape_nul(item), ensure_ascii=False, default=str)
+    return text
+
+
+def _escape_nul(value):
+    if isinstance(value, str):
+        return value.replace("\x00", "\\u0000")
+    if isinstance(value, dict):
+        return {_escape_nul(key): _escape_nul(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_escape_nul(item) for item in value]
+    return value
+
+
+def _advance_watermark(cur, client_id, watermark):
+    # The watermark never moves back, e.g. when an older window is loaded after a newer one
+    cur.execute(f"""
+        INSERT INTO {SCHEMA_NAME}.sync_state (client_id, synced_until)
+        VALUES (%s, %s)
+        ON CONFLICT (client_id) DO UPDATE
+        SET synced_until = GREATEST({SCHEMA_NAME}.sync_state.synced_until, EXCLUDED.synced_until),
+            updated_at = now();
+    """, (client_id, watermark), prepare=True)
+    log.info(f"Sync watermark advanced to {watermark}")
+
+
+def _get_client_id(cur):
+    # Insert CLIENT in Clients table once
+    cur.execute(f"""
+        INSERT INTO {SCHEMA_NAME}.clients (name)
+        VALUES (%s)
+        ON CONFLICT (name) DO NOTHING;
+    """, (CLIENT,), prepare=True)
+
+    # get CLIENTs' id
+    cur.execute(
+        f"SELECT id FROM {SCHEMA_NAME}.clients WHERE name = %s;",
+        (CLIENT,),
+        prepare=True
+    )
+    return cur.fetchone()[0]
@@ -1,44 +1,126 @@
-import psycopg
+import os
 import re
+import psycopg
 from logger import get_general_logger
 from db.config import USER_DB_CONFIG, SCHEMA_NAME, SCHEMA_PLACEHOLDER
+from db.pool import connection
 
 log = get_general_logger(__name__)
 
+CUR_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(CUR_DIR, "migrations")
+MIGRATION_FILE_PATTERN = re.compile(r"(?P<version>\d+)_(?P<name>\w+)\.sql")
+
+# Key of the advisory lock that serializes concurrent migration runs
+MIGRATION_LOCK_KEY = 7_310_432_001
+
 
-def apply_schema():
+def migrate():
     """
-    Apply the database schema from the SQL file db/schema.sql to the target database.
+    Apply the pending migrations from db/migrations to the target database.
+    Every migration runs in its own transaction and is recorded in the schema_migrations table.
+    Concurrent runs are serialized with an advisory lock.
     """
+    _validate_schema_name()
+    migrations = list_migrations()
     try:
-        with psycopg.connect(**USER_DB_CONFIG) as conn:
+        with connection() as conn:
             with conn.cursor() as cur:
+                # Session-level lock; pooled connections outlive this block, so it is released explicitly
+                cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
                 try:
-                    with open("db/schema.sql") as f:
-                        sql_text = f.read()
-                except FileNotFoundError:
-                    log.error("Schema file 'db/schema.sql' not found.")
-                    raise
-
-                # Validate schema name manually because this SQL is loaded from a file
-                # and the schema name is substituted using string replacement, not psycopg.sql.Identifier
-                if _validate_schema_name():
-                    sql_text = sql_text.replace(SCHEMA_PLACEHOLDER, SCHEMA_NAME)
-                try:
-                    cur.execute(sql_text)
-                except psycopg.Error as e:
-                    log.error(f"SQL execution error: {e}")
-                    raise
-            conn.commit()
-            log.info(f"Schema 'db/schema.sql' applied")
+                    cur.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {SCHEMA_NAME}.schema_migrations (
+                            version INTEGER PRIMARY KEY,
+                            name TEXT NOT NULL,
+                            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                        );
+                    """)
+                    cur.execute(f"SELECT version FROM {SCHEMA_NAME}.schema_migrations;")
+                    applied = {row[0] for row in cur.fetchall()}
+                    conn.commit()
+
+                    pending = [m for m in migrations if m[0] not in applied]
+                    if not pending:
+                        log.info(f"Schema is up to date at version {max(applied, default=0)}")
+
+                    for version, name, path in pending:
+                        try:
+                            cur.execute(_read_migration(path))
+                        except psycopg.Error as e:
+                            log.error(f"Migration {os.path.basename(path)} failed: {e}")
+                            raise
+                        cur.execute(
+                            f"INSERT INTO {SCHEMA_NAME}.schema_migrations (version, name) VALUES (%s, %s);",
+                            (version, name)
+                        )
+                        conn.commit()
+                        log.info(f"Migration {os.path.basename(path)} applied")
+                finally:
+                    if not conn.closed:
+                        conn.rollback()
+                        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+                        conn.commit()
+
+    except psycopg.Error as e:
+        log.error(f"Database {USER_DB_CONFIG['dbname']} migration error: {e}")
+        raise
+
+
+def check_schema():
+    """
+    Make sure all migrations are applied, at the cost of one query.
+    Raises RuntimeError if the schema is behind; run `python main.py migrate` then.
+    """
+    latest = max((version for version, _, _ in list_migrations()), default=0)
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT max(version) FROM {SCHEMA_NAME}.schema_migrations;")
+                current = cur.fetchone()[0] or 0
 
+    except psycopg.errors.UndefinedTable:
+        current = 0
     except psycopg.Error as e:
-        log.error(f"Database {USER_DB_CONFIG['name']} connection error: {e}")
+        log.error(f"Database {USER_DB_CONFIG['dbname']} connection error: {e}")
         raise
 
+    if current < latest:
+        log.error(f"Schema is at version {current}, latest migration is {latest}")
+        raise RuntimeError("Database schema is not up to date, run `python main.py migrate`")
+    log.info(f"Schema is up to date at version {current}")
+
+
+def list_migrations():
+    """
+    Return the (version, name, path) of every migration file, ordered by version.
+    """
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_PATTERN.fullmatch(filename)
+        if match:
+            migrations.append((int(match.group("version")), match.group("name"),
+                               os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+def _read_migration(path):
+    try:
+        with open(path) as f:
+            sql_text = f.read()
+    except FileNotFoundError:
+        log.error(f"Migration file '{path}' not found.")
+        raise
+
+    # Validate schema name manually because this SQL is loaded from a file
+    # and the schema name is substituted using string replacement, not psycopg.sql.Identifier
+    if _validate_schema_name():
+        sql_text = sql_text.replace(SCHEMA_PLACEHOLDER, SCHEMA_NAME)
+    return sql_text
+
 
 def _validate_schema_name():
     if not re.fullmatch(r"[a-z_][a-z0-9_]*", SCHEMA_NAME):
         raise ValueError(f"Invalid schema name: {SCHEMA_NAME}")
 
-    return True
\ No newline at end of file
+    return True
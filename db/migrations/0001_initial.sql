@@ -42,4 +42,4 @@ CREATE TABLE IF NOT EXISTS <schema_name>.attempts (
     raw_lis_outcome_service_url TEXT,
 
     UNIQUE (user_id, created_at, raw_lis_result_sourcedid)
-);
\ No newline at end of file
+);
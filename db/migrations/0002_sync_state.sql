@@ -0,0 +1,6 @@
+-- Sync state table: the last successfully loaded created_at per client
+CREATE TABLE IF NOT EXISTS <schema_name>.sync_state (
+    client_id BIGINT PRIMARY KEY REFERENCES <schema_name>.clients(id),
+    last_created_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
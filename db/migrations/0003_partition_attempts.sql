@@ -0,0 +1,92 @@
+-- Attempts table created before partitioning is moved aside and copied over below
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = '<schema_name>' AND c.relname = 'attempts' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE <schema_name>.attempts RENAME TO attempts_unpartitioned;
+        ALTER TABLE <schema_name>.attempts_unpartitioned RENAME CONSTRAINT attempts_pkey TO attempts_unpartitioned_pkey;
+        ALTER TABLE <schema_name>.attempts_unpartitioned
+            RENAME CONSTRAINT attempts_user_id_created_at_raw_lis_result_sourcedid_key TO attempts_unpartitioned_key;
+        ALTER SEQUENCE <schema_name>.attempts_id_seq RENAME TO attempts_unpartitioned_id_seq;
+    END IF;
+END;
+$$;
+
+-- Attempts table, range-partitioned by created_at into monthly partitions.
+-- Partitions are created ahead of inserts with ensure_attempts_partitions().
+CREATE TABLE IF NOT EXISTS <schema_name>.attempts (
+    id BIGSERIAL,
+    created_at TIMESTAMPTZ NOT NULL,
+
+    user_id BIGINT NOT NULL REFERENCES <schema_name>.users(id),
+    course_id BIGINT REFERENCES <schema_name>.courses(id),
+    target_id BIGINT REFERENCES <schema_name>.targets(id),
+
+    attempt_type TEXT NOT NULL,
+    is_correct SMALLINT,
+
+    raw_oauth_consumer_key TEXT,
+    raw_lis_result_sourcedid TEXT NOT NULL,
+    raw_lis_outcome_service_url TEXT,
+
+    PRIMARY KEY (id, created_at),
+    UNIQUE (user_id, created_at, raw_lis_result_sourcedid)
+) PARTITION BY RANGE (created_at);
+
+-- Date-window scans
+CREATE INDEX IF NOT EXISTS attempts_created_at_brin
+    ON <schema_name>.attempts USING BRIN (created_at);
+
+-- Per-course and per-user aggregation without visiting the heap
+CREATE INDEX IF NOT EXISTS attempts_course_created_at_idx
+    ON <schema_name>.attempts (course_id, created_at) INCLUDE (user_id, attempt_type, is_correct);
+CREATE INDEX IF NOT EXISTS attempts_user_created_at_idx
+    ON <schema_name>.attempts (user_id, created_at) INCLUDE (course_id, attempt_type, is_correct);
+
+-- Create the monthly (UTC) attempts partitions covering [from_ts, to_ts]
+CREATE OR REPLACE FUNCTION <schema_name>.ensure_attempts_partitions(from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', from_ts AT TIME ZONE 'UTC');
+BEGIN
+    WHILE month_start AT TIME ZONE 'UTC' <= to_ts LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I.%I PARTITION OF %I.attempts FOR VALUES FROM (%L) TO (%L)',
+            '<schema_name>',
+            'attempts_' || to_char(month_start, 'YYYY_MM'),
+            '<schema_name>',
+            month_start AT TIME ZONE 'UTC',
+            (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+END;
+$$;
+
+-- Copy the attempts of the table created before partitioning
+DO $$
+DECLARE
+    min_created_at TIMESTAMPTZ;
+    max_created_at TIMESTAMPTZ;
+BEGIN
+    IF to_regclass('<schema_name>.attempts_unpartitioned') IS NOT NULL THEN
+        SELECT min(created_at), max(created_at) INTO min_created_at, max_created_at
+        FROM <schema_name>.attempts_unpartitioned;
+
+        IF min_created_at IS NOT NULL THEN
+            PERFORM <schema_name>.ensure_attempts_partitions(min_created_at, max_created_at);
+            INSERT INTO <schema_name>.attempts SELECT * FROM <schema_name>.attempts_unpartitioned;
+            PERFORM setval(
+                pg_get_serial_sequence('<schema_name>.attempts', 'id'),
+                (SELECT max(id) FROM <schema_name>.attempts)
+            );
+        END IF;
+
+        DROP TABLE <schema_name>.attempts_unpartitioned;
+    END IF;
+END;
+$$;
@@ -0,0 +1,64 @@
+-- Daily per-course/per-user rollup of attempts used by the report queries.
+-- A plain table is used instead of a materialized view, since a materialized view can
+-- only be refreshed as a whole; refresh_attempts_daily_rollup() recomputes single days.
+CREATE TABLE IF NOT EXISTS <schema_name>.attempts_daily_rollup (
+    day DATE NOT NULL,
+    course_id BIGINT NOT NULL REFERENCES <schema_name>.courses(id),
+    user_id BIGINT NOT NULL REFERENCES <schema_name>.users(id),
+
+    attempts INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    submits INTEGER NOT NULL,
+    correct_submits INTEGER NOT NULL,
+
+    PRIMARY KEY (day, course_id, user_id)
+);
+
+-- Recompute the rollup rows of the UTC days [from_day, to_day]
+CREATE OR REPLACE FUNCTION <schema_name>.refresh_attempts_daily_rollup(from_day DATE, to_day DATE)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Serialize concurrent refreshes of overlapping days
+    PERFORM pg_advisory_xact_lock(hashtext('<schema_name>.attempts_daily_rollup'));
+
+    DELETE FROM <schema_name>.attempts_daily_rollup
+    WHERE day BETWEEN from_day AND to_day;
+
+    INSERT INTO <schema_name>.attempts_daily_rollup (
+        day, course_id, user_id, attempts, runs, submits, correct_submits
+    )
+    SELECT
+        (created_at AT TIME ZONE 'UTC')::date,
+        course_id,
+        user_id,
+        count(*),
+        count(*) FILTER (WHERE attempt_type = 'run'),
+        count(*) FILTER (WHERE attempt_type = 'submit'),
+        count(*) FILTER (WHERE is_correct = 1)
+    FROM <schema_name>.attempts
+    WHERE created_at >= from_day::timestamp AT TIME ZONE 'UTC'
+      AND created_at < (to_day + 1)::timestamp AT TIME ZONE 'UTC'
+      AND course_id IS NOT NULL
+    GROUP BY 1, 2, 3;
+END;
+$$;
+
+-- Fill the rollup for the attempts loaded before it existed
+DO $$
+DECLARE
+    min_created_at TIMESTAMPTZ;
+    max_created_at TIMESTAMPTZ;
+BEGIN
+    SELECT min(created_at), max(created_at) INTO min_created_at, max_created_at
+    FROM <schema_name>.attempts;
+
+    IF min_created_at IS NOT NULL THEN
+        PERFORM <schema_name>.refresh_attempts_daily_rollup(
+            (min_created_at AT TIME ZONE 'UTC')::date,
+            (max_created_at AT TIME ZONE 'UTC')::date
+        );
+    END IF;
+END;
+$$;
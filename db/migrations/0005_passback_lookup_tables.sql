@@ -0,0 +1,82 @@
+-- Lookup tables for the passback values of attempts.
+-- Consumer keys and outcome service urls take a few distinct values per client,
+-- and a sourcedid repeats for every attempt of a user at a target, so attempts keep
+-- only their integer ids. The raw strings are reconstructed by the attempts_raw view.
+CREATE TABLE IF NOT EXISTS <schema_name>.oauth_consumer_keys (
+    id SERIAL PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS <schema_name>.lis_result_sourcedids (
+    id BIGSERIAL PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS <schema_name>.lis_outcome_service_urls (
+    id SERIAL PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+
+ALTER TABLE <schema_name>.attempts
+    ADD COLUMN IF NOT EXISTS oauth_consumer_key_id INTEGER REFERENCES <schema_name>.oauth_consumer_keys(id),
+    ADD COLUMN IF NOT EXISTS lis_result_sourcedid_id BIGINT REFERENCES <schema_name>.lis_result_sourcedids(id),
+    ADD COLUMN IF NOT EXISTS lis_outcome_service_url_id INTEGER REFERENCES <schema_name>.lis_outcome_service_urls(id);
+
+-- Encode the attempts loaded so far
+INSERT INTO <schema_name>.oauth_consumer_keys (value)
+SELECT DISTINCT raw_oauth_consumer_key FROM <schema_name>.attempts WHERE raw_oauth_consumer_key IS NOT NULL
+ON CONFLICT (value) DO NOTHING;
+
+INSERT INTO <schema_name>.lis_result_sourcedids (value)
+SELECT DISTINCT raw_lis_result_sourcedid FROM <schema_name>.attempts
+ON CONFLICT (value) DO NOTHING;
+
+INSERT INTO <schema_name>.lis_outcome_service_urls (value)
+SELECT DISTINCT raw_lis_outcome_service_url FROM <schema_name>.attempts WHERE raw_lis_outcome_service_url IS NOT NULL
+ON CONFLICT (value) DO NOTHING;
+
+UPDATE <schema_name>.attempts a
+SET oauth_consumer_key_id = k.id
+FROM <schema_name>.oauth_consumer_keys k
+WHERE k.value = a.raw_oauth_consumer_key;
+
+UPDATE <schema_name>.attempts a
+SET lis_result_sourcedid_id = s.id
+FROM <schema_name>.lis_result_sourcedids s
+WHERE s.value = a.raw_lis_result_sourcedid;
+
+UPDATE <schema_name>.attempts a
+SET lis_outcome_service_url_id = u.id
+FROM <schema_name>.lis_outcome_service_urls u
+WHERE u.value = a.raw_lis_outcome_service_url;
+
+ALTER TABLE <schema_name>.attempts ALTER COLUMN lis_result_sourcedid_id SET NOT NULL;
+
+-- The unique key moves to the integer column; it still includes the partition key created_at
+ALTER TABLE <schema_name>.attempts
+    DROP CONSTRAINT IF EXISTS attempts_user_id_created_at_raw_lis_result_sourcedid_key;
+ALTER TABLE <schema_name>.attempts
+    ADD CONSTRAINT attempts_user_id_created_at_sourcedid_key UNIQUE (user_id, created_at, lis_result_sourcedid_id);
+
+ALTER TABLE <schema_name>.attempts
+    DROP COLUMN raw_oauth_consumer_key,
+    DROP COLUMN raw_lis_result_sourcedid,
+    DROP COLUMN raw_lis_outcome_service_url;
+
+-- Attempts with the raw passback strings, as stored before this migration
+CREATE OR REPLACE VIEW <schema_name>.attempts_raw AS
+SELECT
+    a.id,
+    a.created_at,
+    a.user_id,
+    a.course_id,
+    a.target_id,
+    a.attempt_type,
+    a.is_correct,
+    k.value AS raw_oauth_consumer_key,
+    s.value AS raw_lis_result_sourcedid,
+    u.value AS raw_lis_outcome_service_url
+FROM <schema_name>.attempts a
+JOIN <schema_name>.lis_result_sourcedids s ON s.id = a.lis_result_sourcedid_id
+LEFT JOIN <schema_name>.oauth_consumer_keys k ON k.id = a.oauth_consumer_key_id
+LEFT JOIN <schema_name>.lis_outcome_service_urls u ON u.id = a.lis_outcome_service_url_id;
@@ -0,0 +1,22 @@
+-- Quarantine of the raw items rejected by validation (see matching_model.validate_item).
+-- Items are loaded in the same transaction as the attempts of their window and can be
+-- re-validated later with `python main.py replay` without fetching the window again.
+CREATE TABLE IF NOT EXISTS <schema_name>.rejected_items (
+    id BIGSERIAL PRIMARY KEY,
+    client_id BIGINT NOT NULL REFERENCES <schema_name>.clients(id),
+    reason TEXT NOT NULL,
+
+    -- Fetch window the item came with
+    window_start TIMESTAMPTZ NOT NULL,
+    window_end TIMESTAMPTZ NOT NULL,
+
+    item JSONB NOT NULL,
+    rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS rejected_items_reason_window_idx
+    ON <schema_name>.rejected_items (client_id, reason, window_start);
+
+-- Overlapping and repeated fetches deliver the same items again; each is kept once per reason
+CREATE UNIQUE INDEX IF NOT EXISTS rejected_items_item_key
+    ON <schema_name>.rejected_items (client_id, reason, md5(item::text));
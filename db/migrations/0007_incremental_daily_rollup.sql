@@ -0,0 +1,35 @@
+-- Loads add the attempts they actually insert to attempts_daily_rollup incrementally
+-- (see db/loader.py), so refresh_attempts_daily_rollup() no longer runs on every load.
+-- It rebuilds whole days on request with `python main.py rollup`, e.g. after attempts were
+-- deleted or a rollup row was lost.
+-- The global advisory lock, which serialized every load, is replaced with a table lock taken
+-- by the refresh only: SHARE ROW EXCLUSIVE waits for the running loads and holds back new ones
+-- until the recomputed days are committed, while loads still don't block each other.
+CREATE OR REPLACE FUNCTION <schema_name>.refresh_attempts_daily_rollup(from_day DATE, to_day DATE)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    LOCK TABLE <schema_name>.attempts_daily_rollup IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM <schema_name>.attempts_daily_rollup
+    WHERE day BETWEEN from_day AND to_day;
+
+    INSERT INTO <schema_name>.attempts_daily_rollup (
+        day, course_id, user_id, attempts, runs, submits, correct_submits
+    )
+    SELECT
+        (created_at AT TIME ZONE 'UTC')::date,
+        course_id,
+        user_id,
+        count(*),
+        count(*) FILTER (WHERE attempt_type = 'run'),
+        count(*) FILTER (WHERE attempt_type = 'submit'),
+        count(*) FILTER (WHERE is_correct = 1)
+    FROM <schema_name>.attempts
+    WHERE created_at >= from_day::timestamp AT TIME ZONE 'UTC'
+      AND created_at < (to_day + 1)::timestamp AT TIME ZONE 'UTC'
+      AND course_id IS NOT NULL
+    GROUP BY 1, 2, 3;
+END;
+$$;
@@ -0,0 +1,17 @@
+-- The sync watermark is the end of the last completely fetched and loaded window, not the
+-- created_at of the last loaded attempt: the API doesn't return items in created_at order,
+-- and a window without items advances it too. The column is renamed to say so.
+-- The next sync fetches from synced_until minus main.SYNC_OVERLAP.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = '<schema_name>' AND table_name = 'sync_state' AND column_name = 'last_created_at'
+    ) THEN
+        ALTER TABLE <schema_name>.sync_state RENAME COLUMN last_created_at TO synced_until;
+    END IF;
+END;
+$$;
+
+COMMENT ON COLUMN <schema_name>.sync_state.synced_until IS
+    'End of the last completely fetched window loaded for the client; the next sync starts from it';
@@ -0,0 +1,109 @@
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from psycopg_pool import ConnectionPool
+from logger import get_general_logger
+from db.config import ADMIN_POSTGRES_CONFIG, ADMIN_DB_CONFIG, USER_DB_CONFIG
+
+log = get_general_logger(__name__)
+
+# pool name -> (connection config, autocommit, max size).
+# Admin pools are only used by the setup commands and run in autocommit mode,
+# since CREATE DATABASE can't run inside a transaction.
+POOLS = {
+    "admin_postgres": (ADMIN_POSTGRES_CONFIG, True, 1),
+    "admin": (ADMIN_DB_CONFIG, True, 1),
+    "user": (USER_DB_CONFIG, False, 4),
+}
+POOL_MIN_SIZE = 1
+POOL_TIMEOUT = 30               # seconds to wait for a connection before failing
+POOL_MAX_IDLE = 10 * 60         # seconds before an idle connection above min size is closed
+ACQUIRE_WAIT_WARNING = 1        # seconds; longer waits for a connection are logged
+
+_pools = {}
+_pools_lock = threading.Lock()
+# pool name -> {"acquired", "wait_seconds", "max_wait_seconds"}
+_acquire_stats = {}
+
+
+@contextmanager
+def connection(pool_name="user", autocommit=None):
+    """
+    Borrow a connection from the named pool (see POOLS), to be used like psycopg.connect():
+    the transaction is committed when the block exits normally and rolled back on an exception,
+    then the connection goes back to the pool instead of being closed.
+    Session state must not outlive the block, e.g. session advisory locks have to be released.
+    If autocommit is given, it overrides the pool's mode for this block.
+    """
+    pool = get_pool(pool_name)
+    started = time.perf_counter()
+    with pool.connection() as conn:
+        _record_wait(pool_name, time.perf_counter() - started)
+        if autocommit is not None:
+            conn.autocommit = autocommit
+        yield conn
+
+
+def get_pool(pool_name):
+    """
+    Return the named pool, opening it on first use.
+    """
+    with _pools_lock:
+        pool = _pools.get(pool_name)
+        if pool is None:
+            config, autocommit, max_size = POOLS[pool_name]
+            pool = ConnectionPool(
+                conninfo="",
+                kwargs={**config, "autocommit": autocommit},
+                min_size=min(POOL_MIN_SIZE, max_size),
+                max_size=max_size,
+                timeout=POOL_TIMEOUT,
+                max_idle=POOL_MAX_IDLE,
+                reset=_reset_autocommit(autocommit),
+                name=pool_name,
+                open=True,
+            )
+            _pools[pool_name] = pool
+            _acquire_stats[pool_name] = {"acquired": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+        return pool
+
+
+def log_pool_stats():
+    for pool_name, pool in _pools.items():
+        stats = _acquire_stats[pool_name]
+        mean_wait = stats["wait_seconds"] / stats["acquired"] if stats["acquired"] else 0.0
+        pool_stats = pool.get_stats()
+        log.info(f"Connection pool '{pool_name}': {stats['acquired']} acquisitions, "
+                 f"wait mean {mean_wait * 1000:.1f}ms, max {stats['max_wait_seconds'] * 1000:.1f}ms, "
+                 f"{pool_stats.get('connections_num', 0)} connections opened, "
+                 f"{pool_stats.get('requests_errors', 0)} failed requests")
+
+
+def close_pools():
+    with _pools_lock:
+        if _pools:
+            log_pool_stats()
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _reset_autocommit(autocommit):
+    # Called when a connection is returned: undo an autocommit override of connection()
+    def reset(conn):
+        if conn.autocommit != autocommit:
+            conn.autocommit = autocommit
+    return reset
+
+
+def _record_wait(pool_name, wait):
+    stats = _acquire_stats[pool_name]
+    stats["acquired"] += 1
+    stats["wait_seconds"] += wait
+    stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+    if wait > ACQUIRE_WAIT_WARNING:
+        log.warning(f"Waited {wait:.2f}s for a connection from pool '{pool_name}'")
+
+
+atexit.register(close_pools)
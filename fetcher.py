@@ -1,54 +1,578 @@
+import re
+import json
+import time
+import codecs
+import threading
 import requests
 import datetime as dt
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
 import matching_model
+from response_cache import ResponseCache
 from secret.client_settings import *
-from logger import get_general_logger
+from logger import get_general_logger, RecordCollector, failure_sampler
 
 log = get_general_logger(__name__)
 
+# Backfill mode: the requested window is split into sub-intervals of this size
+# which are fetched concurrently.
+BACKFILL_CHUNK = dt.timedelta(hours=6)
+BACKFILL_MAX_WORKERS = 4
+# A chunk that failed is fetched again this many times, on its own, before it is given up
+BACKFILL_CHUNK_RETRIES = 1
 
-def get_data(api_url, start_utc, end_utc):
+# Size of the byte chunks read from a streamed response
+STREAM_CHUNK_SIZE = 64 * 1024
 
-    params = {'client': CLIENT,
-              'client_key': CLIENT_KEY,
-              'start': start_utc.strftime('%Y-%m-%d %H:%M:%S.%f'),
-              'end': end_utc.strftime('%Y-%m-%d %H:%M:%S.%f')}
+# HTTP client settings
+API_TIMEOUT = (10, 300)     # seconds: (connect, read)
+API_MAX_RETRIES = 4
+API_BACKOFF = 1             # seconds, doubled after every retry
+API_POOL_SIZE = BACKFILL_MAX_WORKERS
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-    data = _fetch_api(api_url, params)
-    if not data:
+# Raw responses are cached on disk (see response_cache.py). Windows that ended less than
+# CACHE_MIN_AGE ago are still filling up upstream and are not cached: the sync and pipeline
+# windows end at the time of the run, so their keys never repeat and the entries would
+# only fill the cache. Stored entries that carry ETag/Last-Modified validators are
+# re-requested conditionally, so an unchanged window is answered with 304 Not Modified.
+CACHE_ENABLED = True
+CACHE_MIN_AGE = dt.timedelta(hours=1)
+CONDITIONAL_REQUESTS = True
+
+# Parallel validation: off unless a number of worker processes is given
+VALIDATION_WORKERS = None
+VALIDATION_BATCH_SIZE = 10_000
+
+_WS = re.compile(r"[ \t\n\r]*")
+# Characters that may follow a complete array item
+_ITEM_END = frozenset(" \t\n\r,]")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def get_data(api_url, start_utc, end_utc, chunk=None, max_workers=BACKFILL_MAX_WORKERS,
+             workers=VALIDATION_WORKERS, batch_size=VALIDATION_BATCH_SIZE, as_batch=False, rejected=None,
+             failed_windows=None):
+    """
+    Fetch and validate attempts for the window [start_utc, end_utc].
+    A thin list-returning wrapper around iter_attempts.
+    If as_batch is True, the attempts are collected into a columnar matching_model.AttemptBatch instead.
+    If rejected (a list) is given, it receives the (reason, item) pairs of the rejected items.
+    Without chunk, the error of a fetch that fails partway is raised (see iter_attempts), so a truncated
+    response is never mistaken for a smaller complete one; the sync modes rely on this.
+    In backfill mode the attempts of the chunks that were fetched are returned, and failed_windows
+    (a list), if given, receives the (start, end) of the chunks that could not be fetched.
+    """
+    stats = {}
+    attempts = iter_attempts(api_url, start_utc, end_utc, chunk, max_workers, stats, workers, batch_size,
+                             rejected)
+    attempts = matching_model.AttemptBatch(attempts) if as_batch else list(attempts)
+    if failed_windows is not None:
+        failed_windows.extend(stats["failed_windows"])
+    if stats["items"] == 0:
         log.warning("No data were fetched")
         return None
 
-    log.info(f'Fetched period is {start_utc} - {end_utc}, got {len(data)} items in response')
+    return attempts
+
+
+def iter_attempts(api_url, start_utc, end_utc, chunk=None, max_workers=BACKFILL_MAX_WORKERS, stats=None,
+                  workers=VALIDATION_WORKERS, batch_size=VALIDATION_BATCH_SIZE, rejected=None):
+    """
+    Yield validated attempts for the window [start_utc, end_utc].
+    The response is parsed incrementally, so raw items are validated one by one
+    and memory does not grow with the size of the window.
+    If chunk (a timedelta) is given, the window is fetched in backfill mode:
+    split into sub-intervals of that size and fetched over a bounded thread pool (see _fetch_backfill).
+    If workers is given, items are validated in batches of batch_size
+    over a pool of that many processes (see validate_items).
+    If stats (a dict) is given, it receives the 'items', 'failed' and 'attempts' counters
+    and the 'failed_windows' list of the backfill chunks that could not be fetched.
+    If rejected (a list) is given, it receives the (reason, item) pairs of the rejected items.
+    If the request or the parsing of the response fails, the error is raised after the attempts
+    parsed before it have been yielded: they are an incomplete part of the window.
+    In backfill mode a failed chunk is isolated instead: the other chunks are still yielded
+    and the chunk is reported in stats['failed_windows'].
+    """
+    if stats is None:
+        stats = {}
+    stats.update(items=0, failed=0, attempts=0, failed_windows=[])
+
+    if chunk is not None:
+        chunks = _fetch_backfill(api_url, start_utc, end_utc, chunk, max_workers, stats["failed_windows"])
+    else:
+        chunks = [_stream_api(api_url, start_utc, end_utc)]
 
-    attempts = []
-    failed_attempts = []
     log.info(f"Parsing data items:")
-    for item in data:
-        attempt = matching_model.get_attempt(item)
+    pool = None
+    if workers:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_validation_worker)
+    try:
+        for items in chunks:
+            chunk_attempts = validate_items(items, stats, pool, batch_size, max_pending=2 * (workers or 1),
+                                            rejected=rejected)
+            if chunk is None:
+                yield from chunk_attempts
+                continue
+
+            # Chunks cover consecutive periods, so sorting inside each chunk
+            # is enough to yield the whole window in created_at order.
+            yield from sorted(chunk_attempts, key=lambda att: att.created_at)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    log.info(f'Fetched period is {start_utc} - {end_utc}, got {stats["items"]} items in response')
+    log.info(f"{stats['failed']} items failed validation. See logs/validation.log to inspect warnings and failed items")
+    log_validation_summary()
+    log.info(f"{stats['attempts']} attempts are ready for processing")
+    get_client().log_stats()
+
+
+def validate_items(items, stats, pool=None, batch_size=VALIDATION_BATCH_SIZE, max_pending=8, rejected=None):
+    """
+    Validate raw items with matching_model.get_attempt and yield the attempts in the original order.
+    If pool (a ProcessPoolExecutor created with _init_validation_worker) is given, items are
+    validated there in batches, with at most max_pending batches in flight. The validation
+    log records of the workers are handed back and written by this process,
+    so logs/validation.log keeps the item order.
+    The 'items', 'failed' and 'attempts' counters in stats are updated.
+    If rejected (a list) is given, the (reason, item) pair of every rejected item is appended to it.
+    """
+    if pool is None:
+        for item in items:
+            stats["items"] += 1
+            attempt, reason = matching_model.validate_item(item)
+            if not attempt:
+                stats["failed"] += 1
+                if rejected is not None:
+                    rejected.append((reason, item))
+                continue
+            stats["attempts"] += 1
+            yield attempt
+        return
+
+    pending = deque()
+    for batch in _batched(items, batch_size):
+        pending.append(pool.submit(_validate_batch, batch))
+        if len(pending) >= max_pending:
+            yield from _merge_batch(pending.popleft().result(), stats, rejected)
+    while pending:
+        yield from _merge_batch(pending.popleft().result(), stats, rejected)
+
+
+def _merge_batch(result, stats, rejected):
+    attempts, batch_rejected, records = result
+    for record in records:
+        matching_model.log.handle(record)
+    stats["items"] += len(attempts) + len(batch_rejected)
+    stats["failed"] += len(batch_rejected)
+    stats["attempts"] += len(attempts)
+    if rejected is not None:
+        rejected.extend(batch_rejected)
+    return attempts
+
+
+def _batched(items, batch_size):
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        yield batch
+
+
+_validation_records = None
+
+
+def _init_validation_worker():
+    """
+    Route the validation log of a worker process into a list, which is returned with every batch.
+    """
+    global _validation_records
+    collector = RecordCollector()
+    # Handlers inherited from the parent process are detached, not closed
+    matching_model.log.handlers = [collector]
+    _validation_records = collector.records
+
+
+def _validate_batch(items):
+    _validation_records.clear()
+    attempts = []
+    rejected = []
+    for item in items:
+        attempt, reason = matching_model.validate_item(item)
         if not attempt:
-            failed_attempts.append(item)
+            rejected.append((reason, item))
             continue
         attempts.append(attempt)
-    log.info(f"{len(failed_attempts)} items failed validation. See logs/validation.log to inspect warnings and failed items")
-    log.info(f"{len(attempts)} attempts are ready for processing")
+    return attempts, rejected, list(_validation_records)
 
-    return attempts
+
+def log_validation_summary():
+    """
+    Log the validation errors and warnings of this process by reason.
+    """
+    summary = failure_sampler.summary()
+    if summary:
+        log.info("Validation errors and warnings by reason:")
+    for line in summary:
+        log.info(f"\t{line}")
+
+
+def split_window(start_utc, end_utc, chunk):
+    """
+    Split the inclusive window [start_utc, end_utc] into consecutive inclusive
+    sub-intervals no longer than chunk.
+    """
+    if chunk <= dt.timedelta(0):
+        raise ValueError(f"Chunk size must be positive: {chunk}")
+
+    windows = []
+    chunk_start = start_utc
+    while chunk_start <= end_utc:
+        chunk_end = min(chunk_start + chunk - dt.timedelta(microseconds=1), end_utc)
+        windows.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + dt.timedelta(microseconds=1)
+    return windows
 
 
-def _fetch_api(api_url, params):
-    log.info(f"Getting data from {api_url}:")
+def _get_params(start_utc, end_utc):
+    return {'client': CLIENT,
+            'client_key': CLIENT_KEY,
+            'start': start_utc.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'end': end_utc.strftime('%Y-%m-%d %H:%M:%S.%f')}
 
-    data = None
+
+def _fetch_backfill(api_url, start_utc, end_utc, chunk, max_workers, failed_windows):
+    """
+    Yield the raw items of every chunk of the window, in window order, as lists.
+    At most max_workers chunks are fetched ahead of the one being consumed, so memory
+    holds a few chunks rather than the whole window. A failed chunk is fetched again on its own
+    up to BACKFILL_CHUNK_RETRIES times; if it still fails, it is skipped, logged and appended
+    to failed_windows, and the other chunks are yielded regardless.
+    """
+    windows = split_window(start_utc, end_utc, chunk)
+    log.info(f"Backfill mode: {len(windows)} chunks of {chunk}, {max_workers} workers")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        remaining = iter(windows)
+        pending = deque((window, pool.submit(fetch_window, api_url, *window))
+                        for window in islice(remaining, max_workers))
+        while pending:
+            window, future = pending.popleft()
+            chunk_data = future.result()
+            if (next_window := next(remaining, None)) is not None:
+                pending.append((next_window, pool.submit(fetch_window, api_url, *next_window)))
+            for retry_no in range(BACKFILL_CHUNK_RETRIES):
+                if chunk_data is not None:
+                    break
+                log.warning(f"Chunk {window[0]} - {window[1]} failed, fetching it again ({retry_no + 1})")
+                chunk_data = fetch_window(api_url, *window)
+            if chunk_data is None:
+                failed.append(window)
+                continue
+            yield chunk_data
+
+    if failed:
+        log.error(f"{len(failed)} of {len(windows)} chunks could not be fetched, missing periods:")
+        for chunk_start, chunk_end in failed:
+            log.error(f"\t{chunk_start} - {chunk_end}")
+        failed_windows.extend(failed)
+
+
+def fetch_window(api_url, start_utc, end_utc):
+    """
+    Fetch the whole response for one window as a list of raw items. Returns None on failure;
+    transient errors have already been retried by the client (see ApiClient).
+    """
     try:
-        response = requests.get(api_url, params=params)
-        log.info(f"Status code: {response.status_code}, elapsed: {response.elapsed}")
-        data = response.json()
+        return list(_iter_response_items(api_url, start_utc, end_utc))
     except requests.exceptions.RequestException as e:
-        log.warning("Request failed:", e)
-    except requests.JSONDecodeError as e:
-        log.warning("Failed to parse JSON:", e)
+        log.warning(f"Request failed: {e}")
+    except ValueError as e:
+        log.warning(f"Failed to parse JSON: {e}")
     except Exception as e:
-        log.warning("Unexpected error:", e)
+        log.warning(f"Unexpected error: {e}")
+
+    return None
+
+
+def _stream_api(api_url, start_utc, end_utc):
+    """
+    Yield raw items from the response as they are parsed.
+    A failure is logged and raised: the items yielded before it are only a part of the window.
+    """
+    try:
+        yield from _iter_response_items(api_url, start_utc, end_utc)
+    except requests.exceptions.RequestException as e:
+        log.error(f"Request failed, the fetch of {start_utc} - {end_utc} is incomplete: {e}")
+        raise
+    except ValueError as e:
+        log.error(f"Failed to parse JSON, the fetch of {start_utc} - {end_utc} is incomplete: {e}")
+        raise
+
+
+def _iter_response_items(api_url, start_utc, end_utc):
+    params = _get_params(start_utc, end_utc)
+    cache = get_cache()
+    if cache is None:
+        yield from get_client().iter_items(api_url, params)
+        return
+
+    if end_utc > dt.datetime.now(dt.timezone.utc) - CACHE_MIN_AGE:
+        # Not settled yet, see CACHE_MIN_AGE
+        yield from get_client().iter_items(api_url, params)
+        return
+
+    key = cache.key(CLIENT, params['start'], params['end'])
+    chunks = cache.read(key)
+    if chunks is not None:
+        log.info(f"Using the cached response for {start_utc} - {end_utc}")
+        yield from iter_json_array(chunks)
+        return
+
+    yield from iter_json_array(get_client().iter_chunks(api_url, params, cache, key))
+
+
+class ApiClient:
+    """
+    Reusable client for the Simulative API.
+    Keeps a pooled keep-alive session, negotiates gzip, retries 5xx/429 responses
+    and connection errors with exponential backoff and collects fetch counters in stats.
+    If conditional is True, a request whose response is stored in the response cache
+    with ETag/Last-Modified validators is sent as a conditional one, and a 304 reply is
+    served from the cache, also by a later process.
+    """
+
+    def __init__(self, timeout=API_TIMEOUT, max_retries=API_MAX_RETRIES, backoff=API_BACKOFF,
+                 pool_size=API_POOL_SIZE, conditional=CONDITIONAL_REQUESTS):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.conditional = conditional
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "not_modified": 0,
+            "bytes": 0,                 # decoded response bytes
+            "wire_bytes": 0,            # bytes read from the socket, before decompression
+            "latency_seconds": 0.0,     # time to response headers
+            "transfer_seconds": 0.0,    # time spent reading response bodies
+        }
+
+    def iter_items(self, api_url, params):
+        """
+        Request the API and yield the raw items of the JSON array response as they are parsed.
+        Raises requests.exceptions.RequestException if the request keeps failing.
+        """
+        yield from iter_json_array(self.iter_chunks(api_url, params))
+
+    def iter_chunks(self, api_url, params, cache=None, key=None, settled=True):
+        """
+        Request the API and yield the decoded response body in byte chunks.
+        If cache (a ResponseCache) is given, the response is stored under key: as a regular
+        entry if the window is settled, otherwise only for conditional requests (see ResponseCache.tee).
+        Raises requests.exceptions.RequestException if the request keeps failing.
+        """
+        validators = cache.validators(key) if cache is not None and self.conditional else None
+
+        headers = {}
+        if validators:
+            etag, last_modified = validators
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._request(api_url, params, headers)
+        if response.status_code == 304:
+            response.close()
+            stored = cache.read(key, revalidated=True) if validators else None
+            if stored is not None:
+                self._count(not_modified=1)
+                log.info("Response not modified since the last fetch, reusing the cached body")
+                cache.revalidated(key, revalidate=not settled)
+                yield from stored
+                return
+            # The entry was evicted meanwhile
+            response = self._request(api_url, params, {})
+
+        with response:
+            chunks = self._read(response)
+            if cache is not None:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if settled or (self.conditional and (etag or last_modified)):
+                    chunks = cache.tee(key, chunks, etag, last_modified, revalidate=not settled)
+            yield from chunks
+
+    def log_stats(self):
+        log.info(f"API client stats: {', '.join(f'{name}={value}' for name, value in self.stats.items())}")
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, api_url, params, headers):
+        log.info(f"Getting data from {api_url}:")
+
+        delay = self.backoff
+        for retry_no in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.get(api_url, params=params, headers=headers,
+                                            timeout=self.timeout, stream=True)
+                self._count(requests=1, latency_seconds=response.elapsed.total_seconds())
+                log.info(f"Status code: {response.status_code}, elapsed: {response.elapsed}")
+
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                error = requests.exceptions.HTTPError(f"{response.status_code} Server Error", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._count(requests=1)
+                error = e
+
+            if retry_no == self.max_retries:
+                self._count(errors=1)
+                raise error
+
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else delay
+            log.warning(f"{error}, retry {retry_no + 1}/{self.max_retries} in {wait}s")
+            self._count(retries=1)
+            time.sleep(wait)
+            delay *= 2
+
+    def _read(self, response):
+        size = 0
+        started = time.perf_counter()
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            yield chunk
+
+        self._count(bytes=size, wire_bytes=response.raw.tell(),
+                    transfer_seconds=time.perf_counter() - started)
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+
+_client = None
+_cache = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide ApiClient, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
+
+
+def get_cache():
+    """
+    Return the process-wide ResponseCache, or None if caching is disabled.
+    """
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _client_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def iter_json_array(byte_chunks):
+    """
+    Incrementally parse a JSON array from an iterable of UTF-8 byte chunks
+    and yield its items one by one.
+    Raises json.JSONDecodeError (a ValueError) if the input is not a JSON array.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(byte_chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def read_more():
+        nonlocal buf, pos, exhausted
+        # Drop the consumed part so the buffer stays about one item long
+        buf = buf[pos:]
+        pos = 0
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                buf += text
+                return
+        buf += decoder.decode(b"", final=True)
+        exhausted = True
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            match = _WS.match(buf, pos)
+            pos = match.end()
+            if pos < len(buf) or exhausted:
+                return
+            read_more()
+
+    skip_ws()
+    if buf[pos:pos + 1] != "[":
+        raise json.JSONDecodeError("Expected a JSON array", buf, pos)
+    pos += 1
+
+    def finish():
+        nonlocal pos
+        # Read up to the end of the input, so the chunk source is exhausted too
+        pos += 1
+        skip_ws()
+        if pos < len(buf):
+            raise json.JSONDecodeError("Extra data", buf, pos)
+
+    skip_ws()
+    if buf[pos:pos + 1] == "]":
+        finish()
+        return
+
+    while True:
+        skip_ws()
+        try:
+            item, end = _JSON_DECODER.raw_decode(buf, pos)
+            # A value cut at the buffer end may still decode, e.g. '15000000000.' as the int
+            # before the '.', so it is only accepted once the character after it is seen.
+            if not exhausted and (end == len(buf) or buf[end] not in _ITEM_END):
+                raise json.JSONDecodeError("Incomplete value", buf, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            read_more()
+            continue
+        yield item
+        pos = end
 
-    return data
\ No newline at end of file
+        skip_ws()
+        delimiter = buf[pos:pos + 1]
+        if delimiter == "]":
+            finish()
+            return
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expected ',' or ']'", buf, pos)
+        pos += 1
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import resource
+import threading
+import tracemalloc
+import datetime as dt
+from contextlib import contextmanager
+from logger import get_general_logger
+
+log = get_general_logger(__name__)
+
+METRICS_DIR = "metrics"
+RUN_SUMMARY_FILE = os.path.join(METRICS_DIR, "run_summary.json")
+# Point this to the node_exporter --collector.textfile.directory to export the metrics
+PROMETHEUS_TEXTFILE_DIR = METRICS_DIR
+PROMETHEUS_PREFIX = "sml_hub"
+
+# Stages profiled with cProfile / traced with tracemalloc, set from the command line.
+# Profiles are written to PROFILE_DIR and can be read with `python -m pstats`.
+PROFILE_STAGES = set()
+TRACEMALLOC_STAGES = set()
+PROFILE_DIR = os.path.join(METRICS_DIR, "profiles")
+PROFILE_TOP = 20
+
+# Finished spans of this run, in the order they finished
+_spans = []
+_spans_lock = threading.Lock()
+_run_started = time.time()
+
+
+class Span:
+    """
+    Measurements of one stage. items and bytes are filled in by the caller when known.
+    cpu_seconds is the CPU time of the stage's thread, process_cpu_seconds that of
+    all threads of the process during the stage; neither includes worker processes.
+    """
+
+    def __init__(self, name, items=None, bytes=None):
+        self.name = name
+        self.items = items
+        self.bytes = bytes
+        self.ok = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.process_cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.traced_peak_bytes = None
+
+    def to_dict(self):
+        return {name: value for name, value in vars(self).items() if value is not None}
+
+
+@contextmanager
+def span(name, items=None, bytes=None):
+    """
+    Measure the stage run inside the block: wall time, CPU time and the peak RSS of the process
+    at its end, plus the items and bytes set on the yielded Span. The span is recorded for the
+    run summary (see write_run_report) even if the block raises.
+    """
+    current = Span(name, items, bytes)
+    profiler = _start_profiler(name)
+    tracing = _start_tracemalloc(name)
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    process_cpu_started = time.process_time()
+    try:
+        yield current
+        current.ok = True
+    except BaseException:
+        current.ok = False
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - wall_started
+        current.cpu_seconds = time.thread_time() - cpu_started
+        current.process_cpu_seconds = time.process_time() - process_cpu_started
+        current.peak_rss_bytes = _peak_rss_bytes()
+        if tracing:
+            current.traced_peak_bytes = _stop_tracemalloc(name)
+        if profiler is not None:
+            _stop_profiler(name, profiler)
+
+        with _spans_lock:
+            _spans.append(current)
+        log.info(f"Stage '{name}': {current.wall_seconds:.2f}s wall, {current.cpu_seconds:.2f}s CPU, "
+                 f"peak RSS {current.peak_rss_bytes / 1024 ** 2:.0f} MiB"
+                 + (f", {current.items} items" if current.items is not None else "")
+                 + (f", {current.bytes} bytes" if current.bytes is not None else ""))
+
+
+def write_run_report(mode, ok):
+    """
+    Write the spans of this run to the JSON run summary and to a Prometheus textfile
+    named after the mode, so that runs of different modes don't overwrite each other's metrics.
+    """
+    finished = time.time()
+    with _spans_lock:
+        spans = [current.to_dict() for current in _spans]
+
+    summary = {
+        "mode": mode,
+        "ok": ok,
+        "started_at": dt.datetime.fromtimestamp(_run_started, dt.timezone.utc).isoformat(),
+        "finished_at": dt.datetime.fromtimestamp(finished, dt.timezone.utc).isoformat(),
+        "wall_seconds": round(finished - _run_started, 3),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "stages": spans,
+    }
+    try:
+        _write_atomic(RUN_SUMMARY_FILE, json.dumps(summary, indent=2))
+        _write_atomic(os.path.join(PROMETHEUS_TEXTFILE_DIR, f"{PROMETHEUS_PREFIX}_{mode}.prom"),
+                      _prometheus_text(summary))
+    except OSError as e:
+        log.warning(f"Could not write the run report: {e}")
+
+
+def _prometheus_text(summary):
+    mode = summary["mode"]
+    metrics = [
+        ("stage_wall_seconds", "Wall time of the stage", "wall_seconds"),
+        ("stage_cpu_seconds", "CPU time of the stage's thread", "cpu_seconds"),
+        ("stage_process_cpu_seconds", "CPU time of the process during the stage", "process_cpu_seconds"),
+        ("stage_peak_rss_bytes", "Peak RSS of the process at the end of the stage", "peak_rss_bytes"),
+        ("stage_items", "Items processed by the stage", "items"),
+        ("stage_bytes", "Bytes processed by the stage", "bytes"),
+        ("stage_success", "1 if the stage succeeded", "ok"),
+    ]
+    lines = []
+    for metric, help_text, key in metrics:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{metric} {help_text}.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge")
+        for current in summary["stages"]:
+            if key in current:
+                lines.append(f'{PROMETHEUS_PREFIX}_{metric}{{mode="{mode}",stage="{current["name"]}"}} '
+                             f'{float(current[key])}')
+
+    run_metrics = [
+        ("run_wall_seconds", "Wall time of the last run", summary["wall_seconds"]),
+        ("run_peak_rss_bytes", "Peak RSS of the last run", summary["peak_rss_bytes"]),
+        ("run_success", "1 if the last run succeeded", summary["ok"]),
+        ("run_finished_timestamp_seconds", "Unix time the last run finished",
+         dt.datetime.fromisoformat(summary["finished_at"]).timestamp()),
+    ]
+    for metric, help_text, value in run_metrics:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{metric} {help_text}.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge")
+        lines.append(f'{PROMETHEUS_PREFIX}_{metric}{{mode="{mode}"}} {float(value)}')
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    # The textfile collector may read at any moment, so the file is replaced, never rewritten
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _start_profiler(name):
+    if name not in PROFILE_STAGES and "all" not in PROFILE_STAGES:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Only one profiler can be active at a time, e.g. with concurrent stages
+        log.warning(f"Stage '{name}' not profiled: {e}")
+        return None
+    return profiler
+
+
+def _stop_profiler(name, profiler):
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.prof")
+    profiler.dump_stats(path)
+    log.info(f"Profile of stage '{name}' written to {path}")
+
+
+def _start_tracemalloc(name):
+    if name not in TRACEMALLOC_STAGES and "all" not in TRACEMALLOC_STAGES:
+        return False
+    if tracemalloc.is_tracing():
+        log.warning(f"Stage '{name}' not traced: tracemalloc is already tracing another stage")
+        return False
+    tracemalloc.start()
+    return True
+
+
+def _stop_tracemalloc(name):
+    snapshot = tracemalloc.take_snapshot()
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    log.info(f"Stage '{name}' traced allocations peak at {traced_peak / 1024 ** 2:.1f} MiB, "
+             f"largest live allocations at the end of the stage:")
+    for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+        log.info(f"\t{stat}")
+    return traced_peak
@@ -1,12 +1,29 @@
 import logging
+import logging.handlers
 import os
+import json
+import queue
+import atexit
+import threading
 import datetime as dt
+import multiprocessing
+from collections import Counter
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
 LOG_RETENTION_DAYS = 3
 
+# Validation log: "async" writes compact JSON lines from a background thread
+# (QueueHandler/QueueListener), "sync" writes text records directly as before.
+VALIDATION_LOG_MODE = "async"
+# Every failure reason is logged in full for its first VALIDATION_SAMPLE_FIRST items;
+# after that only every VALIDATION_SAMPLE_EVERY-th item is, the rest are only counted.
+VALIDATION_SAMPLE_FIRST = 20
+VALIDATION_SAMPLE_EVERY = 1000
+
+_cleanup_done = False
+
 
 def _cleanup_old_logs(logger):
     cutoff = (dt.datetime.now() - dt.timedelta(days=LOG_RETENTION_DAYS)).date()
@@ -52,7 +69,11 @@ def get_general_logger(name):
     if not file_exists:
         logger.info(f"New log file is created: {os.path.basename(log_path)}")
 
-    _cleanup_old_logs(logger)
+    # Once per process, not for every module that asks for a logger
+    global _cleanup_done
+    if not _cleanup_done:
+        _cleanup_done = True
+        _cleanup_old_logs(logger)
 
     return logger
 
@@ -64,15 +85,118 @@ def get_validation_failures_logger(name):
 
     logger.setLevel(logging.INFO)
 
+    if multiprocessing.parent_process() is not None:
+        # Worker processes must not truncate the parent's validation.log,
+        # their records are handed back to the parent instead.
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        return logger
+
     log_path = os.path.join(LOG_DIR, "validation.log")  # always same file
     handler = logging.FileHandler(log_path, mode="w", encoding="utf-8")
 
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-    handler.setFormatter(formatter)
+    if VALIDATION_LOG_MODE == "async":
+        handler.setFormatter(JsonLinesFormatter())
+        # The file is written by the listener thread, validation only puts records on the queue
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = logging.handlers.QueueHandler(records)
+    else:
+        handler.setFormatter(ValidationFormatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    # Sampled before the queue, so dropped records cost neither the queue nor the disk
+    handler.addFilter(failure_sampler)
 
     logger.addHandler(handler)
     logger.propagate = False
 
     logger.info("Current session data validation log")
 
-    return logger
\ No newline at end of file
+    return logger
+
+
+class RecordCollector(logging.Handler):
+    """
+    Handler that keeps the records in a list, e.g. to pass them from a worker process to its parent.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class FailureSampler(logging.Filter):
+    """
+    Count validation records per failure reason (the 'reason' attribute, see matching_model)
+    and let through the first VALIDATION_SAMPLE_FIRST records of each reason and then
+    every VALIDATION_SAMPLE_EVERY-th one. Records without a reason always pass.
+    """
+
+    def __init__(self, first=VALIDATION_SAMPLE_FIRST, every=VALIDATION_SAMPLE_EVERY):
+        super().__init__()
+        self.first = first
+        self.every = every
+        self.counts = Counter()
+        self.suppressed = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        reason = getattr(record, "reason", None)
+        if reason is None:
+            return True
+        with self._lock:
+            self.counts[reason] += 1
+            count = self.counts[reason]
+            if count <= self.first or (count - self.first) % self.every == 0:
+                return True
+            self.suppressed[reason] += 1
+            return False
+
+    def summary(self):
+        """
+        One line per reason: 'reason: count (suppressed in the log)', most frequent first.
+        """
+        with self._lock:
+            return [f"{reason}: {count} ({self.suppressed[reason]} not logged)"
+                    for reason, count in self.counts.most_common()]
+
+
+failure_sampler = FailureSampler()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One compact JSON object per record; the failure reason and the raw item are separate keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": dt.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        reason = getattr(record, "reason", None)
+        if reason is not None:
+            entry["reason"] = reason
+        if hasattr(record, "item"):
+            entry["item"] = record.item
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class ValidationFormatter(logging.Formatter):
+    """
+    Text format of the validation log with the raw item appended.
+    """
+
+    def format(self, record):
+        message = super().format(record)
+        if hasattr(record, "item"):
+            message += f"\n\tItem:\n\t{record.item}"
+        return message
+
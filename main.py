@@ -1,14 +1,37 @@
+import argparse
 import datetime as dt
 from secret import client_settings
-from fetcher import get_data
+import instrumentation
+from fetcher import get_data, get_client
 from db.admin import *
-from db.migrate import apply_schema
-from db.loader import insert_data
+from db.migrate import migrate, check_schema
+from db.loader import bulk_insert_data, get_watermark, set_watermark, iter_rejected_items, refresh_daily_rollup
+from matching_model import AttemptBatch, validate_item
 from reports.gsheets import upload_attempts_to_sheet, export_report
+from reports.sql_report import export_report_from_db
+from stages import Stage, run_stages, check_stages
+from pipeline import run_pipeline
+from instrumentation import span, write_run_report
 from logger import get_general_logger
 
 log = get_general_logger(__name__)
 
+# Incremental sync: every run fetches from the end of the last loaded window minus the overlap
+# up to now. The overlap picks up items that reach the API late; duplicates are skipped on insert.
+SYNC_OVERLAP = dt.timedelta(minutes=15)
+# Window of the very first sync of a client
+SYNC_INITIAL_LOOKBACK = dt.timedelta(hours=24)
+
+# Quarantined items re-validated and loaded per transaction by replay()
+REPLAY_BATCH_SIZE = 10_000
+
+# Seconds each sink of main() may take; see stages.py
+STAGE_TIMEOUTS = {
+    "insert": 30 * 60,
+    "sheets_upload": 30 * 60,
+    "report": 5 * 60,
+}
+
 
 def main():
 
@@ -20,35 +43,226 @@ def main():
     end_utc = start_utc + duration
 
     log.info(f"Started preparing data")
-    attempts = get_data(client_settings.API_URL, start_utc, end_utc)
+    rejected = []
+    attempts = _fetch(start_utc, end_utc, rejected)
 
-    if len(attempts) == 0:
+    if attempts is None:
         log.info(f"The fetched data contains no items")
         return
     log.info("Finished preparing data")
 
-    # Database preparation
-    log.info("Started preparing database")
-    db_create_if_not_exist()
-    user_create_if_not_exist()
-    schema_create_if_not_exists()
-    apply_schema()
-    log.info("Finished preparing database")
+    with span("db_prep"):
+        check_schema()
+
+    # Specify the title of the sheet for the report
+    sheet_title = f"{client_settings.CLIENT} {start_utc.strftime('%Y-%m-%d %H:%M')}-{end_utc.strftime('%Y-%m-%d %H:%M')}"
+
+    # The sinks only read the validated attempts, so they run concurrently;
+    # a failure of one of them doesn't stop the others.
+    results = run_stages([
+        Stage("insert", _measured("insert", lambda: bulk_insert_data(attempts, rejected=rejected,
+                                                                      window=(start_utc, end_utc)), len(attempts)),
+              STAGE_TIMEOUTS["insert"]),
+        Stage("sheets_upload", _measured("sheets_upload", lambda: upload_attempts_to_sheet(attempts), len(attempts)),
+              STAGE_TIMEOUTS["sheets_upload"]),
+        Stage("report", _measured("report", lambda: export_report(attempts, sheet_title)), STAGE_TIMEOUTS["report"]),
+    ])
+    check_stages(results)
+
+    # See today's log file to check the results of the workflow.
+
+
+def sync():
+    """
+    Incremental sync: load everything since the client's watermark into the database
+    and advance the watermark to the end of the fetched window in the same transaction.
+    A window without items still advances the watermark. A fetch that fails partway raises
+    (see fetcher.get_data), so nothing is loaded and the watermark stays where it was.
+    Reports are not generated.
+    """
+    with span("db_prep"):
+        check_schema()
+    start_utc, end_utc = _get_sync_window()
+
+    log.info("Started preparing data")
+    rejected = []
+    attempts = _fetch(start_utc, end_utc, rejected)
+
+    if attempts is None:
+        # The window was fetched completely, so the next sync starts from its end all the same
+        log.info("The fetched data contains no items")
+        set_watermark(end_utc)
+        return
+    log.info("Finished preparing data")
 
     log.info("Started inserting attempts into database")
-    insert_data(attempts)
+    with span("insert", items=len(attempts)):
+        bulk_insert_data(attempts, advance_watermark=True, watermark=end_utc, rejected=rejected,
+                         window=(start_utc, end_utc))
     log.info("Finished inserting attempts into database")
 
 
-    log.info("Started generating report")
-    upload_attempts_to_sheet(attempts)
+def sync_pipeline():
+    """
+    Incremental sync as a streaming pipeline: the window since the watermark is split into
+    pipeline.PIPELINE_CHUNK windows, which are fetched, validated and loaded concurrently
+    and committed one by one, each advancing the watermark. An interrupted run is resumed
+    by the next sync from the last committed window.
+    """
+    with span("db_prep"):
+        check_schema()
+    start_utc, end_utc = _get_sync_window()
 
-    # Specify the title of the sheet for the report
-    sheet_title = f"{client_settings.CLIENT} {start_utc.strftime('%Y-%m-%d %H:%M')}-{end_utc.strftime('%Y-%m-%d %H:%M')}"
-    export_report(attempts, sheet_title)
+    log.info("Started pipeline")
+    with span("pipeline") as pipeline_span:
+        stats = run_pipeline(client_settings.API_URL, start_utc, end_utc)
+        pipeline_span.items = stats["items"]
+        pipeline_span.bytes = get_client().stats["bytes"]
+    log.info("Finished pipeline")
+
+
+def _fetch(start_utc, end_utc, rejected):
+    # Fetching and validation are interleaved, so they are measured as one stage
+    bytes_before = get_client().stats["bytes"]
+    with span("fetch") as fetch_span:
+        attempts = get_data(client_settings.API_URL, start_utc, end_utc, as_batch=True, rejected=rejected)
+        fetch_span.items = len(attempts) + len(rejected) if attempts is not None else 0
+        fetch_span.bytes = get_client().stats["bytes"] - bytes_before
+    return attempts
+
+
+def _measured(name, func, items=None):
+    # Wraps a stage function of run_stages into a span
+    def run():
+        with span(name, items=items):
+            func()
+    return run
+
+
+def _get_sync_window():
+    end_utc = dt.datetime.now(dt.timezone.utc)
+    watermark = get_watermark()
+    if watermark is None:
+        start_utc = end_utc - SYNC_INITIAL_LOOKBACK
+        log.info(f"No sync watermark for {client_settings.CLIENT}, starting from {start_utc}")
+    else:
+        start_utc = watermark - SYNC_OVERLAP
+        log.info(f"Sync watermark is {watermark}, fetching from {start_utc}")
+    return start_utc, end_utc
+
+
+def replay(reason=None):
+    """
+    Re-validate the quarantined items (all of them, or those rejected for reason) with
+    the current validation rules, in batches and without contacting the API.
+    Items that pass now are loaded and removed from quarantine in the same transaction.
+    """
+    check_schema()
+
+    log.info("Started replaying quarantined items")
+    recovered = 0
+    still_rejected = 0
+    with span("replay") as replay_span:
+        for rows in iter_rejected_items(REPLAY_BATCH_SIZE, reason):
+            attempts = AttemptBatch()
+            replayed_ids = []
+            for row_id, _, item in rows:
+                attempt, _ = validate_item(item)
+                if attempt:
+                    attempts.append(attempt)
+                    replayed_ids.append(row_id)
+
+            still_rejected += len(rows) - len(replayed_ids)
+            if replayed_ids:
+                bulk_insert_data(attempts, replayed_ids=replayed_ids)
+                recovered += len(replayed_ids)
+        replay_span.items = recovered + still_rejected
+
+    log.info(f"{recovered} quarantined items recovered, {still_rejected} still rejected")
+    log.info("Finished replaying quarantined items")
+
+
+def report(start_day, end_day):
+    """
+    Export the report for the UTC days [start_day, end_day] computed in the database,
+    without fetching anything from the API.
+    """
+    check_schema()
+
+    log.info("Started generating report")
+    sheet_title = f"{client_settings.CLIENT} {start_day.isoformat()}-{end_day.isoformat()}"
+    with span("report"):
+        export_report_from_db(start_day, end_day, sheet_title)
     log.info("Finished generating report")
 
-    # See today's log file to check the results of the workflow.
+
+def rollup(start_day, end_day):
+    """
+    Rebuild the daily report rollup of the UTC days [start_day, end_day] from the loaded attempts.
+    Loads add to the rollup incrementally, so this only needs to run after attempts were removed
+    or to repair the rollup, e.g. from a scheduled job.
+    """
+    check_schema()
+
+    with span("rollup"):
+        refresh_daily_rollup(start_day, end_day)
+
+
+def prepare_database():
+    """
+    Create the database, the user and the schema if needed and apply pending migrations.
+    Run once on setup and after updates with `python main.py migrate`, not on every pipeline run.
+    """
+    log.info("Started preparing database")
+    with span("migrate"):
+        db_create_if_not_exist()
+        user_create_if_not_exist()
+        schema_create_if_not_exists()
+        migrate()
+    log.info("Finished preparing database")
+
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser(description="SML Assessment Hub pipeline")
+    arg_parser.add_argument("mode", nargs="?", choices=["run", "sync", "pipeline", "report", "rollup", "replay", "migrate"], default="run",
+                            help="'run' processes the fixed window set in main(), "
+                                 "'sync' loads everything since the last sync, "
+                                 "'pipeline' does the same as a stream of separately committed windows, "
+                                 "'report' exports a report over --start..--end from the database, "
+                                 "'rollup' rebuilds the daily report rollup over --start..--end, "
+                                 "'replay' re-validates and loads quarantined items (optionally only --reason), "
+                                 "'migrate' prepares the database and applies pending migrations")
+    arg_parser.add_argument("--start", type=dt.date.fromisoformat, help="first UTC day of the report or rollup, YYYY-MM-DD")
+    arg_parser.add_argument("--end", type=dt.date.fromisoformat, help="last UTC day of the report or rollup, YYYY-MM-DD")
+    arg_parser.add_argument("--reason", help="validation failure reason of the items to replay, e.g. invalid_created_at")
+    arg_parser.add_argument("--profile", action="append", default=[], metavar="STAGE",
+                            help="profile the stage with cProfile ('all' for every stage), can be repeated")
+    arg_parser.add_argument("--trace-memory", action="append", default=[], metavar="STAGE",
+                            help="trace the allocations of the stage with tracemalloc, can be repeated")
+    args = arg_parser.parse_args()
+    if args.mode in ("report", "rollup") and args.start is None:
+        arg_parser.error(f"{args.mode} mode requires --start")
+
+    instrumentation.PROFILE_STAGES.update(args.profile)
+    instrumentation.TRACEMALLOC_STAGES.update(args.trace_memory)
+
+    ok = False
+    try:
+        if args.mode == "sync":
+            sync()
+        elif args.mode == "pipeline":
+            sync_pipeline()
+        elif args.mode == "report":
+            report(args.start, args.end or args.start)
+        elif args.mode == "rollup":
+            rollup(args.start, args.end or args.start)
+        elif args.mode == "replay":
+            replay(args.reason)
+        elif args.mode == "migrate":
+            prepare_database()
+        else:
+            main()
+        ok = True
+    finally:
+        # See metrics/run_summary.json and the Prometheus textfile for the stage measurements
+        write_run_report(args.mode, ok)
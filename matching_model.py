@@ -1,20 +1,40 @@
 import re
 import json
 import datetime as dt
-from collections import namedtuple
+from array import array
+from collections import namedtuple, Counter
 from logger import get_validation_failures_logger
 from dateutil import parser, tz
 
 PASSBACK_LIS_RESULT_SOURCEDID_PATTERN = r"course-v1:(?P<course>[^:]+):lms\.skillfactory\.ru-(?P<target_id>[^:]+):(?P<user_id>.+)"
-EXPECTED_RAW_DATA_FIELDS = {"lti_user_id", "attempt_type", "created_at", "is_correct", "passback_params"}
-EXPECTED_RAW_PASSBACK_PARAMS_FIELDS = {"oauth_consumer_key", "lis_result_sourcedid", "lis_outcome_service_url"}
+EXPECTED_RAW_DATA_FIELDS = frozenset({"lti_user_id", "attempt_type", "created_at", "is_correct", "passback_params"})
+EXPECTED_RAW_PASSBACK_PARAMS_FIELDS = frozenset({"oauth_consumer_key", "lis_result_sourcedid", "lis_outcome_service_url"})
+ATTEMPT_TYPES = frozenset({"submit", "run"})
+IS_CORRECT_VALUES = frozenset({None, 0, 1})
 UNKNOWN = "__unknown__"
 ABSENT = "__absent__"
 
+# Validation failure reasons, passed to the log as the 'reason' of the record.
+# Errors reject the item, warnings only flag it.
+NOT_A_DICT = "not_a_dict"
+FIELDS_MISMATCH = "fields_mismatch"
+INVALID_USER_ID = "invalid_user_id"
+INVALID_ATTEMPT_TYPE = "invalid_attempt_type"
+INVALID_IS_CORRECT = "invalid_is_correct"
+INVALID_CREATED_AT = "invalid_created_at"
+INVALID_PASSBACK = "invalid_passback"
+USER_ID_MISMATCH = "user_id_mismatch"
+PASSBACK_FIELDS_MISMATCH = "passback_fields_mismatch"
+UNPARSED_SOURCEDID = "unparsed_sourcedid"
+
 log = get_validation_failures_logger(__name__)
 
 pattern = re.compile(PASSBACK_LIS_RESULT_SOURCEDID_PATTERN)
 
+# Passback params come as a dict repr with single quotes. A single module-level decoder
+# skips the per-call argument handling of json.loads.
+_decode_passback = json.JSONDecoder().decode
+
 Attempt = namedtuple("Attempt",
     [
         "user_id",
@@ -29,42 +49,174 @@ Attempt = namedtuple("Attempt",
     ])
 
 
+class AttemptBatch:
+    """
+    Columnar container of attempts.
+    String fields are dictionary-encoded: every column keeps the list of its distinct values
+    and an array of 32-bit codes into it, so repeated course names, consumer keys and service
+    URLs are stored once. created_at is kept as int64 epoch microseconds (UTC) and is_correct
+    as a signed byte with -1 standing for None.
+    Iteration yields Attempt rows, so a batch can be passed wherever a list of attempts is expected.
+    """
+
+    ENCODED_FIELDS = ("user_id", "course_name", "target_id", "attempt_type",
+                      "raw_oauth_consumer_key", "raw_lis_result_sourcedid", "raw_lis_outcome_service_url")
+
+    def __init__(self, attempts=()):
+        self.created_at = array("q")
+        self.is_correct = array("b")
+        self.codes = {field: array("I") for field in self.ENCODED_FIELDS}
+        self.values = {field: [] for field in self.ENCODED_FIELDS}
+        self._lookup = {field: {} for field in self.ENCODED_FIELDS}
+        self.extend(attempts)
+
+    def append(self, attempt):
+        self.created_at.append((attempt.created_at - _EPOCH) // _MICROSECOND)
+        self.is_correct.append(-1 if attempt.is_correct is None else attempt.is_correct)
+        for field in self.ENCODED_FIELDS:
+            self.codes[field].append(self._encode(field, getattr(attempt, field)))
+
+    def extend(self, attempts):
+        for attempt in attempts:
+            self.append(attempt)
+
+    def column(self, field):
+        """
+        Return an iterator over the decoded values of a column.
+        """
+        if field == "created_at":
+            return map(_from_epoch_micros, self.created_at)
+        if field == "is_correct":
+            return (None if value < 0 else value for value in self.is_correct)
+        return map(self.values[field].__getitem__, self.codes[field])
+
+    def count(self, field):
+        """
+        Return a Counter of the values of a column, counted over the codes.
+        """
+        if field == "created_at":
+            return Counter(self.column(field))
+        if field == "is_correct":
+            return Counter({None if value < 0 else value: n
+                            for value, n in Counter(self.is_correct).items()})
+        values = self.values[field]
+        return Counter({values[code]: n for code, n in Counter(self.codes[field]).items()})
+
+    def unique(self, field):
+        return set(self.count(field))
+
+    def group_by(self, field):
+        """
+        Split the batch by the values of an encoded column.
+        Returns a dict of value -> AttemptBatch; the sub-batches share the value dictionaries of this one.
+        """
+        positions = {}
+        for position, code in enumerate(self.codes[field]):
+            positions.setdefault(code, []).append(position)
+        values = self.values[field]
+        return {values[code]: self._take(batch_positions) for code, batch_positions in positions.items()}
+
+    def __len__(self):
+        return len(self.created_at)
+
+    def __iter__(self):
+        return map(Attempt._make, zip(*(self.column(field) for field in Attempt._fields)))
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        return Attempt._make(
+            self._decode(field, position) for field in Attempt._fields
+        )
+
+    def _decode(self, field, position):
+        if field == "created_at":
+            return _from_epoch_micros(self.created_at[position])
+        if field == "is_correct":
+            value = self.is_correct[position]
+            return None if value < 0 else value
+        return self.values[field][self.codes[field][position]]
+
+    def _encode(self, field, value):
+        lookup = self._lookup[field]
+        try:
+            code = lookup.get(value)
+        except TypeError:
+            # Unhashable values (malformed passback params) are stored without deduplication
+            code = None
+            lookup = None
+        if code is None:
+            code = len(self.values[field])
+            self.values[field].append(value)
+            if lookup is not None:
+                lookup[value] = code
+        return code
+
+    def _take(self, positions):
+        batch = AttemptBatch()
+        batch.values = self.values
+        batch._lookup = self._lookup
+        batch.created_at = array("q", (self.created_at[p] for p in positions))
+        batch.is_correct = array("b", (self.is_correct[p] for p in positions))
+        batch.codes = {field: array("I", (codes[p] for p in positions)) for field, codes in self.codes.items()}
+        return batch
+
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+def _from_epoch_micros(value):
+    return _EPOCH + dt.timedelta(microseconds=value)
+
+
 def get_attempt(data_item):
+    """
+    Return the Attempt of a raw item, or None if the item is rejected.
+    """
+    return validate_item(data_item)[0]
+
+
+def validate_item(data_item):
+    """
+    Validate a raw item. Returns (Attempt, None), or (None, reason) if the item is rejected,
+    where reason is one of the failure reason constants of this module.
+    """
     # raw fields check
     if not isinstance(data_item, dict):
-        log.error(f"Data item is not a dict:\n\tItem:\n\t{data_item}")
-        return None
+        log.error("Data item is not a dict", extra={"reason": NOT_A_DICT, "item": data_item})
+        return None, NOT_A_DICT
 
-    item_fields = set(data_item.keys())
-    if item_fields != EXPECTED_RAW_DATA_FIELDS:
-        log.error(f"Item fields mismatch: {item_fields}\n\tItem:\n\t{data_item}")
-        return None
+    # dict keys views compare with sets directly, no set is built for a valid item
+    if data_item.keys() != EXPECTED_RAW_DATA_FIELDS:
+        log.error(f"Item fields mismatch: {set(data_item.keys())}", extra={"reason": FIELDS_MISMATCH, "item": data_item})
+        return None, FIELDS_MISMATCH
 
     # user id validation
     user_id = data_item["lti_user_id"]
     if not isinstance(user_id, str) or len(user_id) == 0:
-        log.error(f"User ID mismatch: {user_id}\n\tItem:\n\t{data_item}")
-        return None
+        log.error(f"User ID mismatch: {user_id}", extra={"reason": INVALID_USER_ID, "item": data_item})
+        return None, INVALID_USER_ID
 
     # attempt type validation
     attempt_type = data_item["attempt_type"]
-    if not attempt_type in {"submit", "run"}:
-        log.error(f"Invalid attempt type: {attempt_type}\n\tItem:\n\t{data_item}")
-        return None
+    if attempt_type not in ATTEMPT_TYPES:
+        log.error(f"Invalid attempt type: {attempt_type}", extra={"reason": INVALID_ATTEMPT_TYPE, "item": data_item})
+        return None, INVALID_ATTEMPT_TYPE
 
     # is_correct param validation
     is_correct = data_item["is_correct"]
-    if not is_correct in {None, 0, 1}:
-        log.error(f"Field 'is_correct' not recognized: {is_correct}\n\tItem:\n\t{data_item}")
-        return None
+    if is_correct not in IS_CORRECT_VALUES:
+        log.error(f"Field 'is_correct' not recognized: {is_correct}", extra={"reason": INVALID_IS_CORRECT, "item": data_item})
+        return None, INVALID_IS_CORRECT
 
     # created_at validation
     try:
-        dt_object = parser.parse(data_item["created_at"])
-        created_at = dt_object.replace(tzinfo=dt.timezone.utc)
-    except (ValueError, TypeError):
-        log.error(f"Could not parse datetime: {data_item['created_at']}\n\tItem:\n\t{data_item}")
-        return None
+        created_at = parse_created_at(data_item["created_at"])
+    except (ValueError, TypeError, OverflowError):
+        log.error(f"Could not parse datetime: {data_item['created_at']}",
+                  extra={"reason": INVALID_CREATED_AT, "item": data_item})
+        return None, INVALID_CREATED_AT
 
     # passback params
     try:
@@ -72,18 +224,20 @@ def get_attempt(data_item):
         if not isinstance(raw_passback, str):
             raise TypeError("passback_params is not a string")
 
-        passback_params = json.loads(raw_passback.replace("'", '"'))
+        passback_params = _decode_passback(raw_passback.replace("'", '"'))
         if not isinstance(passback_params, dict):
             raise TypeError("passback_params is not a dict")
 
     except (json.JSONDecodeError, TypeError):
-        log.error(f"Invalid JSON in passback params: {data_item['passback_params']}\n\tItem:\n\t{data_item}")
-        return None
+        log.error(f"Invalid JSON in passback params: {data_item['passback_params']}",
+                  extra={"reason": INVALID_PASSBACK, "item": data_item})
+        return None, INVALID_PASSBACK
 
     # passback fields
-    passback_params_fields = set(passback_params.keys())
-    if passback_params_fields != EXPECTED_RAW_PASSBACK_PARAMS_FIELDS:
-        log.warning(f"Passback params mismatch: {passback_params_fields}\n\tItem:\n\t{data_item}")
+    if passback_params.keys() != EXPECTED_RAW_PASSBACK_PARAMS_FIELDS:
+        passback_params_fields = set(passback_params.keys())
+        log.warning(f"Passback params mismatch: {passback_params_fields}",
+                    extra={"reason": PASSBACK_FIELDS_MISMATCH, "item": data_item})
         for absent_param in EXPECTED_RAW_PASSBACK_PARAMS_FIELDS.difference(passback_params_fields):
             passback_params[absent_param] = ABSENT
 
@@ -95,12 +249,14 @@ def get_attempt(data_item):
 
     if match:
         if user_id != match.group("user_id"):
-            log.error(f"User ID mismatch:\n general: {user_id}\n in passback params: {match.group('user_id')}\n\tItem:\n\t{data_item}")
-            return None
+            log.error(f"User ID mismatch:\n general: {user_id}\n in passback params: {match.group('user_id')}",
+                      extra={"reason": USER_ID_MISMATCH, "item": data_item})
+            return None, USER_ID_MISMATCH
         course_name = match.group("course").replace("+", " ")
         target_id = match.group("target_id")
     else:
-        log.warning(f"Could not parse 'lis_result_sourcedid' passback param: {passback_params.get('lis_result_sourcedid')}\n\tItem:\n\t{data_item}")
+        log.warning(f"Could not parse 'lis_result_sourcedid' passback param: {passback_params.get('lis_result_sourcedid')}",
+                    extra={"reason": UNPARSED_SOURCEDID, "item": data_item})
         course_name = UNKNOWN
         target_id = passback_params.get('lis_result_sourcedid')
 
@@ -115,4 +271,18 @@ def get_attempt(data_item):
         raw_oauth_consumer_key=passback_params.get("oauth_consumer_key"),
         raw_lis_result_sourcedid=passback_params.get("lis_result_sourcedid"),
         raw_lis_outcome_service_url=passback_params.get("lis_outcome_service_url")
-    )
+    ), None
+
+
+def parse_created_at(value):
+    """
+    Parse a 'created_at' value into a UTC datetime.
+    ISO 8601 strings take the fast datetime.fromisoformat path, anything else
+    falls back to the generic dateutil parser.
+    Any offset in the value is replaced with UTC, not converted.
+    """
+    try:
+        dt_object = dt.datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        dt_object = parser.parse(value)
+    return dt_object.replace(tzinfo=dt.timezone.utc)
@@ -0,0 +1,151 @@
+import queue
+import threading
+import datetime as dt
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import matching_model
+from fetcher import (split_window, fetch_window, validate_items, get_client, log_validation_summary,
+                     _init_validation_worker, VALIDATION_WORKERS, VALIDATION_BATCH_SIZE)
+from db.loader import bulk_insert_data
+from logger import get_general_logger
+
+log = get_general_logger(__name__)
+
+# Every window of this size is fetched, validated and committed as one batch
+PIPELINE_CHUNK = dt.timedelta(hours=1)
+# Windows waiting between two stages; memory is capped at about 2 * depth + 3 windows
+PIPELINE_QUEUE_DEPTH = 2
+
+# Messages passed between the stages: a window with its raw items or attempts,
+# a failure that stops the pipeline, or the end of the stream
+_Window = namedtuple("_Window", ["start", "end", "payload", "rejected"], defaults=[None])
+_Failure = namedtuple("_Failure", ["start", "end", "error"])
+_DONE = object()
+
+
+def run_pipeline(api_url, start_utc, end_utc, chunk=PIPELINE_CHUNK, queue_depth=PIPELINE_QUEUE_DEPTH,
+                 workers=VALIDATION_WORKERS, batch_size=VALIDATION_BATCH_SIZE):
+    """
+    Load the window [start_utc, end_utc] into the database as a stream of chunk-sized windows.
+    Fetching, validation and loading run concurrently, connected by queues of queue_depth windows,
+    so window N is loaded while window N+1 is validated and window N+2 is fetched, and
+    a slow stage holds the others back instead of letting memory grow.
+
+    Every window is committed in its own transaction, together with its rejected items
+    (see db/migrations/0006_rejected_items.sql), which also advances the sync watermark
+    to the window's end. Windows are loaded in order and the pipeline stops at the first
+    window that fails, so the watermark never skips a gap: a run that fails or is interrupted
+    is resumed by the next sync from the last committed window.
+    Raises RuntimeError after the committed windows are logged if a window could not be fetched.
+    Returns the stats dict with the 'items', 'failed', 'attempts' and 'windows' counters.
+    """
+    windows = split_window(start_utc, end_utc, chunk)
+    log.info(f"Pipeline mode: {len(windows)} windows of {chunk}, queue depth {queue_depth}")
+
+    stats = {"items": 0, "failed": 0, "attempts": 0, "windows": 0}
+    raw_windows = queue.Queue(maxsize=queue_depth)
+    attempt_windows = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    pool = None
+    if workers:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_validation_worker)
+
+    threads = [
+        threading.Thread(target=_fetch_stage, args=(api_url, windows, raw_windows, stop),
+                         name="pipeline-fetch", daemon=True),
+        threading.Thread(target=_validate_stage, args=(raw_windows, attempt_windows, stats, pool, batch_size, stop),
+                         name="pipeline-validate", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        failed_window = _load_stage(attempt_windows, stats)
+    finally:
+        # Unblocks the other stages if loading failed
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    log.info(f"{stats['windows']} of {len(windows)} windows loaded, {stats['items']} items fetched, "
+             f"{stats['failed']} items failed validation, {stats['attempts']} valid attempts")
+    log_validation_summary()
+    get_client().log_stats()
+    if failed_window is not None:
+        raise RuntimeError(f"Pipeline stopped at window {failed_window[0]} - {failed_window[1]}, "
+                           f"which could not be fetched; the next sync resumes from the last loaded window")
+    return stats
+
+
+def _fetch_stage(api_url, windows, raw_windows, stop):
+    try:
+        for start, end in windows:
+            if stop.is_set():
+                return
+            items = fetch_window(api_url, start, end)
+            if items is None:
+                _put(raw_windows, _Failure(start, end, None), stop)
+                return
+            if not _put(raw_windows, _Window(start, end, items), stop):
+                return
+        _put(raw_windows, _DONE, stop)
+    except Exception as e:
+        _put(raw_windows, _Failure(None, None, e), stop)
+
+
+def _validate_stage(raw_windows, attempt_windows, stats, pool, batch_size, stop):
+    try:
+        while (message := _get(raw_windows, stop)) is not None:
+            if isinstance(message, _Window):
+                rejected = []
+                attempts = validate_items(message.payload, stats, pool, batch_size, rejected=rejected)
+                message = message._replace(payload=matching_model.AttemptBatch(attempts), rejected=rejected)
+            if not _put(attempt_windows, message, stop) or not isinstance(message, _Window):
+                return
+    except Exception as e:
+        _put(attempt_windows, _Failure(None, None, e), stop)
+
+
+def _load_stage(attempt_windows, stats):
+    """
+    Load the windows in order. Returns the (start, end) of the window that could not be fetched, if any.
+    """
+    while True:
+        message = attempt_windows.get()
+        if message is _DONE:
+            return None
+        if isinstance(message, _Failure):
+            if message.error is not None:
+                raise message.error
+            log.error(f"Window {message.start} - {message.end} could not be fetched, pipeline stopped; "
+                      f"the next sync resumes from the last loaded window")
+            return message.start, message.end
+
+        log.info(f"Loading window {message.start} - {message.end}: {len(message.payload)} attempts")
+        bulk_insert_data(message.payload, advance_watermark=True, watermark=message.end,
+                         rejected=message.rejected, window=(message.start, message.end))
+        stats["windows"] += 1
+
+
+def _get(q, stop):
+    # Returns None once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _put(q, message, stop):
+    # Blocks while the queue is full, but gives up once the pipeline is stopped
+    while not stop.is_set():
+        try:
+            q.put(message, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
@@ -1,80 +1,86 @@
 import os
 import random
 import string
+import threading
 from datetime import datetime
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from logger import get_general_logger
+from secret import client_settings
 from secret.client_settings import EXPORT_SPREADSHEET_ID, REPORT_SPREADSHEET_ID
-from attempts_metrics import *
-from statistics import median, mean
+from attempts_metrics import compute_report_metrics
+from reports.uploader import SheetsUploader
 
 log = get_general_logger(__name__)
 
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+# drive.file covers only the files the service account creates, i.e. the rollover spreadsheets it shares
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.file"]
+
+# Users and groups the spreadsheets created on rollover are shared with (see reports/uploader.py),
+# e.g. ["user:owner@example.com", "group:analysts@example.com"]. Without them a rollover fails.
+ROLLOVER_SHARE_WITH = getattr(client_settings, "ROLLOVER_SHARE_WITH", [])
 
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
 SERVICE_ACCOUNT_FILE = os.path.join(CUR_DIR, "..", "secret", "service_account.json")
 
+# The Google client libraries are imported on first use, so runs without reports don't load them.
+# Credentials and the discovery documents are shared by the whole process; services are per thread,
+# because the underlying httplib2 connection is not thread-safe.
+_credentials = None
+_discovery_documents = {}
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+# {spreadsheet id: {sheet id: title}}, see _get_sheets
+_sheet_titles = {}
+
+ATTEMPTS_HEADER = ["created_at", "user_id", "course_name", "target_id",
+                   "attempt_type", "is_correct", "raw_oauth_consumer_key",
+                   "raw_lis_result_sourcedid", "raw_lis_outcome_service_url"]
+
+REPORT_HEADER = ["course name", "total attempts count", "unique users", "avg attempts per user",
+                 "median attempts per user", "total runs", "total submits", "successful submits"]
+
 
 def upload_attempts_to_sheet(attempts):
     """
     Upload a batch of attempts to Google Sheets.
     A new sheet is created per fetch, named 'YYYY-MM-DD hh:mm fetch'.
+    Rows are written in chunks, paced to the Sheets quotas; if the spreadsheet's cell limit
+    is reached, the upload continues on sheets named 'YYYY-MM-DD hh:mm fetch (2)' etc.
+    See reports/uploader.py.
     """
     if not attempts:
         return
 
+    from googleapiclient.errors import HttpError
     try:
         sheet_service = get_sheet_service()
 
         # Sheet name: YYYY-MM-DD hh:mm fetch
         sheet_name = datetime.now().strftime("%Y-%m-%d %H:%M fetch")
 
-        # Create the sheet for the current report
-        sheet_service.batchUpdate(
-            spreadsheetId=EXPORT_SPREADSHEET_ID,
-            body={
-                "requests": [{
-                    "addSheet": {
-                        "properties": {"title": sheet_name, "index": 0}
-                    }
-                }]
-            }
-        ).execute()
-
-        # Prepare data (header + rows)
-        rows = [["created_at", "user_id", "course_name", "target_id",
-                 "attempt_type", "is_correct", "raw_oauth_consumer_key",
-                 "raw_lis_result_sourcedid", "raw_lis_outcome_service_url"]]
-        for att in attempts:
-            rows.append([
-                att.created_at.isoformat() if hasattr(att.created_at, "isoformat") else str(att.created_at),
-                att.user_id,
-                att.course_name,
-                att.target_id,
-                att.attempt_type,
-                att.is_correct,
-                att.raw_oauth_consumer_key,
-                att.raw_lis_result_sourcedid,
-                att.raw_lis_outcome_service_url,
-            ])
-
-        # Write data in one batch
-        sheet_service.values().update(
-            spreadsheetId=EXPORT_SPREADSHEET_ID,
-            range=f"{sheet_name}!A1",
-            valueInputOption="RAW",
-            body={"values": rows}
-        ).execute()
-        log.info(f"Working spreadsheetId '{EXPORT_SPREADSHEET_ID}'")
-        log.info(f"Attempts uploaded to sheet '{sheet_name}'")
+        uploader = SheetsUploader(sheet_service, EXPORT_SPREADSHEET_ID, drive_service=get_drive_service(),
+                                  share_with=ROLLOVER_SHARE_WITH)
+        sheets = uploader.upload(sheet_name, ATTEMPTS_HEADER, (_attempt_row(att) for att in attempts), len(attempts))
+        for spreadsheet_id, title in sheets:
+            log.info(f"Attempts uploaded to sheet '{title}' of spreadsheetId '{spreadsheet_id}'")
 
     except HttpError as e:
         log.error(f"Google Sheets API error: {e}")
 
 
+def _attempt_row(att):
+    return [
+        att.created_at.isoformat() if hasattr(att.created_at, "isoformat") else str(att.created_at),
+        att.user_id,
+        att.course_name,
+        att.target_id,
+        att.attempt_type,
+        att.is_correct,
+        att.raw_oauth_consumer_key,
+        att.raw_lis_result_sourcedid,
+        att.raw_lis_outcome_service_url,
+    ]
+
+
 def export_report(attempts, sheet_title):
     """
     Export aggregated attempt statistics to a Google Sheets report.
@@ -82,129 +88,172 @@ def export_report(attempts, sheet_title):
     if not attempts:
         return
 
+    write_report(get_report_rows(attempts), sheet_title)
+
+
+def get_report_rows(attempts):
+    """
+    Compute the report rows: header, one row per course and the totals row.
+    """
+    metrics = compute_report_metrics(attempts)
+    return [REPORT_HEADER] + [list(course) for course in metrics.courses] + [list(metrics.total)]
+
+
+def write_report(rows, sheet_title):
+    """
+    Write report rows (header first, totals last) to a new sheet of the report spreadsheet.
+    The sheet, its values and the bold header and totals are created by a single batchUpdate,
+    so the report either appears complete or not at all.
+    """
+    from googleapiclient.errors import HttpError
     try:
         sheet_service = get_sheet_service()
 
-        # Ensures the sheet title is unique by appending random characters if needed
-        spreadsheet = sheet_service.get(spreadsheetId=REPORT_SPREADSHEET_ID).execute()
-        existing_titles = [sheet["properties"]["title"] for sheet in spreadsheet.get("sheets", [])]
-        original = sheet_title
-        while sheet_title in existing_titles:
-            suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=4))
-            sheet_title = f"{original}_{suffix}"
-
-        # Create the sheet for the current report
-        response = sheet_service.batchUpdate(
-            spreadsheetId=REPORT_SPREADSHEET_ID,
-            body={
-                "requests": [{
-                    "addSheet": {
-                        "properties": {"title": sheet_title, "index": 0}
-                    }
-                }]
-            }
-        ).execute()
-        sheet_id = response["replies"][0]["addSheet"]["properties"]["sheetId"]
-
-        # Header
-        rows = [["course name", "total attempts count", "unique users", "avg attempts per user",
-                 "median attempts per user", "total runs", "total submits", "successful submits"]]
-        attempts_per_course = get_attempts_per_course(attempts)
-
-        # Prepare metrics for each course
-        for course in attempts_per_course:
-            course_attempts = attempts_per_course[course]
-            attempts_per_user = count_attempts_per_user(course_attempts)
-            attempt_types = count_attempt_types(course_attempts)
-            correctness = count_correctness(course_attempts)
-
-            rows.append([
-                course,                                     # course name
-                len(course_attempts),                       # total attempts count
-                len(attempts_per_user),                     # unique users
-                round(mean(attempts_per_user.values()), 2), # avg attempts per user
-                median(attempts_per_user.values()),         # median attempts per user
-                attempt_types.get("run", 0),                # total runs
-                attempt_types.get("submit", 0),             # total submits
-                correctness.get(1, 0)                       # proportion of successful submits
-            ])
-
-        # Add totals
-        total_attempts_per_user = count_attempts_per_user(attempts)
-        total_attempt_types = count_attempt_types(attempts)
-        correctness = count_correctness(attempts)
-
-        rows.append([
-            "total",
-            len(attempts),
-            len(total_attempts_per_user),
-            round(mean(total_attempts_per_user.values()), 2),
-            median(total_attempts_per_user.values()),
-            total_attempt_types.get("run", 0),
-            total_attempt_types.get("submit", 0),
-            correctness.get(1, 0)
-        ])
-
-        # Write data in one batch
-        sheet_service.values().update(
-            spreadsheetId=REPORT_SPREADSHEET_ID,
-            range=f"{sheet_title}!A1",
-            valueInputOption="RAW",
-            body={"values": rows}
-        ).execute()
+        for attempt_no in range(2):
+            sheets = _get_sheets(sheet_service, REPORT_SPREADSHEET_ID, refresh=attempt_no > 0)
+            title = _unique_title(sheet_title, sheets.values())
+            sheet_id = _new_sheet_id(sheets)
+            try:
+                sheet_service.batchUpdate(
+                    spreadsheetId=REPORT_SPREADSHEET_ID,
+                    body={"requests": _report_requests(sheet_id, title, rows)}
+                ).execute()
+                break
+            except HttpError as e:
+                # The cached titles may be stale if another run added a sheet meanwhile
+                if e.resp.status != 400 or attempt_no > 0:
+                    raise
+                log.warning(f"Adding report sheet '{title}' failed, retrying with fresh sheet titles: {e}")
 
-        # Make header and totals bold
-        row_count = len(attempts_per_course) + 2    # total number of rows with header and totals
-        requests = [
-            # Bold header
-            {
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": 0,
-                        "endRowIndex": 1
-                    },
-                    "cell": {
-                        "userEnteredFormat": {
-                            "textFormat": {"bold": True}
-                        }
-                    },
-                    "fields": "userEnteredFormat.textFormat.bold"
-                }
-            },
-
-            # Bold totals
-            {
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": row_count - 1,
-                        "endRowIndex": row_count
-                    },
-                    "cell": {
-                        "userEnteredFormat": {
-                            "textFormat": {"bold": True}
-                        }
-                    },
-                    "fields": "userEnteredFormat.textFormat.bold"
+        sheets[sheet_id] = title
+        log.info(f"Working spreadsheetId '{REPORT_SPREADSHEET_ID}'")
+        log.info(f"Report uploaded to sheet '{title}'")
+
+    except HttpError as e:
+        log.error(f"Google Sheets API error: {e}")
+
+
+def _report_requests(sheet_id, title, rows):
+    """
+    Requests that add the sheet sized to the report and fill it in, with bold header and totals.
+    """
+    last_row = len(rows) - 1
+    return [
+        {
+            "addSheet": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "title": title,
+                    "index": 0,
+                    "gridProperties": {"rowCount": len(rows), "columnCount": max(len(row) for row in rows)}
                 }
             }
-        ]
+        },
+        {
+            "updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": [
+                    {"values": [_cell(value, bold=row_no in (0, last_row)) for value in row]}
+                    for row_no, row in enumerate(rows)
+                ],
+                "fields": "userEnteredValue,userEnteredFormat.textFormat.bold"
+            }
+        }
+    ]
+
 
-        sheet_service.batchUpdate(
-            spreadsheetId=REPORT_SPREADSHEET_ID,
-            body={"requests": requests}
+def _cell(value, bold=False):
+    # updateCells takes typed values, unlike values().update with RAW input
+    if value is None:
+        cell = {}
+    elif isinstance(value, bool):
+        cell = {"userEnteredValue": {"boolValue": value}}
+    elif isinstance(value, (int, float)):
+        cell = {"userEnteredValue": {"numberValue": value}}
+    else:
+        cell = {"userEnteredValue": {"stringValue": str(value)}}
+    if bold:
+        cell["userEnteredFormat"] = {"textFormat": {"bold": True}}
+    return cell
+
+
+def _get_sheets(sheet_service, spreadsheet_id, refresh=False):
+    """
+    Return the {sheet id: title} dict of a spreadsheet, fetched once per process and then
+    kept up to date by write_report.
+    """
+    with _service_lock:
+        sheets = _sheet_titles.get(spreadsheet_id)
+    if sheets is None or refresh:
+        spreadsheet = sheet_service.get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets.properties(sheetId,title)"
         ).execute()
+        sheets = {sheet["properties"]["sheetId"]: sheet["properties"]["title"]
+                  for sheet in spreadsheet.get("sheets", [])}
+        with _service_lock:
+            _sheet_titles[spreadsheet_id] = sheets
+    return sheets
 
-        log.info(f"Working spreadsheetId '{REPORT_SPREADSHEET_ID}'")
-        log.info(f"Report uploaded to sheet '{sheet_title}'")
 
-    except HttpError as e:
-        log.error(f"Google Sheets API error: {e}")
+def _unique_title(sheet_title, existing_titles):
+    # Ensures the sheet title is unique by appending random characters if needed
+    existing_titles = set(existing_titles)
+    title = sheet_title
+    while title in existing_titles:
+        suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=4))
+        title = f"{sheet_title}_{suffix}"
+    return title
+
+
+def _new_sheet_id(sheets):
+    # Sheet ids are chosen by the client so that later requests of the same batch can refer to the sheet
+    while True:
+        sheet_id = random.randint(1, 2 ** 31 - 1)
+        if sheet_id not in sheets:
+            return sheet_id
 
 
 def get_sheet_service():
-    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+    """
+    Return the spreadsheets resource of the calling thread's Sheets service.
+    The service is built once per thread from the static discovery document bundled with
+    google-api-python-client, so no discovery request is made, and all threads share
+    one credentials object, so an access token is fetched once and reused until it expires.
+    """
+    return _get_service("sheets", "v4").spreadsheets()
+
+
+def get_drive_service():
+    """
+    Return the calling thread's Drive service, built like the Sheets one (see get_sheet_service).
+    """
+    return _get_service("drive", "v3")
+
+
+def _get_service(api, version):
+    services = getattr(_thread_local, "services", None)
+    if services is None:
+        services = _thread_local.services = {}
+    service = services.get(api)
+    if service is None:
+        from googleapiclient.discovery import build_from_document
+        credentials, document = _get_credentials_and_document(api, version)
+        service = services[api] = build_from_document(document, credentials=credentials)
+    return service
+
 
-    service = build("sheets", "v4", credentials=creds)
-    return service.spreadsheets()
\ No newline at end of file
+def _get_credentials_and_document(api, version):
+    global _credentials
+    with _service_lock:
+        if _credentials is None:
+            from google.oauth2 import service_account
+            _credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        if api not in _discovery_documents:
+            from googleapiclient.discovery_cache import get_static_doc
+            document = get_static_doc(api, version)
+            if document is None:
+                raise RuntimeError(f"Static discovery document for {api} {version} not found, "
+                                   "update google-api-python-client")
+            _discovery_documents[api] = document
+        return _credentials, _discovery_documents[api]
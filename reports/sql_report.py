@@ -0,0 +1,110 @@
+import psycopg
+from logger import get_general_logger
+from db.config import SCHEMA_NAME
+from db.pool import connection
+from secret.client_settings import CLIENT
+from reports.gsheets import REPORT_HEADER, write_report
+
+log = get_general_logger(__name__)
+
+# Both queries return the report columns in REPORT_HEADER order.
+# Per-user sums come first, so unique users, mean and median are taken over users.
+COURSE_METRICS_QUERY = f"""
+    WITH per_user AS (
+        SELECT
+            r.course_id,
+            r.user_id,
+            sum(r.attempts) AS attempts,
+            sum(r.runs) AS runs,
+            sum(r.submits) AS submits,
+            sum(r.correct_submits) AS correct_submits
+        FROM {SCHEMA_NAME}.attempts_daily_rollup r
+        JOIN {SCHEMA_NAME}.courses c ON c.id = r.course_id
+        JOIN {SCHEMA_NAME}.clients cl ON cl.id = c.client_id
+        WHERE cl.name = %(client)s AND r.day BETWEEN %(start_day)s AND %(end_day)s
+        GROUP BY r.course_id, r.user_id
+    )
+    SELECT
+        c.name,
+        sum(p.attempts),
+        count(*),
+        round(avg(p.attempts), 2),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY p.attempts),
+        sum(p.runs),
+        sum(p.submits),
+        sum(p.correct_submits)
+    FROM per_user p
+    JOIN {SCHEMA_NAME}.courses c ON c.id = p.course_id
+    GROUP BY c.name
+    ORDER BY c.name;
+"""
+
+TOTAL_METRICS_QUERY = f"""
+    WITH per_user AS (
+        SELECT
+            r.user_id,
+            sum(r.attempts) AS attempts,
+            sum(r.runs) AS runs,
+            sum(r.submits) AS submits,
+            sum(r.correct_submits) AS correct_submits
+        FROM {SCHEMA_NAME}.attempts_daily_rollup r
+        JOIN {SCHEMA_NAME}.courses c ON c.id = r.course_id
+        JOIN {SCHEMA_NAME}.clients cl ON cl.id = c.client_id
+        WHERE cl.name = %(client)s AND r.day BETWEEN %(start_day)s AND %(end_day)s
+        GROUP BY r.user_id
+    )
+    SELECT
+        'total',
+        sum(attempts),
+        count(*),
+        round(avg(attempts), 2),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY attempts),
+        sum(runs),
+        sum(submits),
+        sum(correct_submits)
+    FROM per_user
+    HAVING count(*) > 0;
+"""
+
+
+def get_report_rows_from_db(start_day, end_day):
+    """
+    Compute the report rows for the UTC days [start_day, end_day] in PostgreSQL
+    from the daily rollup (see db/migrations/0004_attempts_daily_rollup.sql).
+    Returns the same rows as reports.gsheets.get_report_rows, or None if there are no attempts.
+    """
+    params = {"client": CLIENT, "start_day": start_day, "end_day": end_day}
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(COURSE_METRICS_QUERY, params)
+                course_rows = cur.fetchall()
+                cur.execute(TOTAL_METRICS_QUERY, params)
+                total_row = cur.fetchone()
+
+    except psycopg.Error as e:
+        log.error(f"Error computing report: {e}")
+        raise
+
+    if total_row is None:
+        return None
+    return [REPORT_HEADER] + [_to_sheet_row(row) for row in course_rows] + [_to_sheet_row(total_row)]
+
+
+def export_report_from_db(start_day, end_day, sheet_title):
+    """
+    Export the report for the UTC days [start_day, end_day] computed in the database.
+    """
+    rows = get_report_rows_from_db(start_day, end_day)
+    if rows is None:
+        log.info(f"No attempts in the database for {start_day} - {end_day}")
+        return
+
+    write_report(rows, sheet_title)
+
+
+def _to_sheet_row(row):
+    # Numeric and float values are converted to the types the in-memory report produces
+    name, total, users, avg, median, runs, submits, correct = row
+    median = int(median) if float(median).is_integer() else median
+    return [name, int(total), users, float(avg), median, int(runs), int(submits), int(correct)]
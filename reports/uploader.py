@@ -0,0 +1,230 @@
+import time
+import random
+from itertools import islice, chain
+from logger import get_general_logger
+
+log = get_general_logger(__name__)
+
+# Google Sheets limits
+SPREADSHEET_CELL_LIMIT = 10_000_000
+CELL_LIMIT_MARGIN = 10_000              # cells kept free for report sheets and formatting
+CHUNK_MAX_BYTES = 2 * 1024 ** 2         # recommended maximum request payload
+CHUNK_MAX_ROWS = 20_000
+
+# Write requests per minute per user, and how many may be sent back to back
+REQUESTS_PER_MINUTE = 60
+REQUESTS_BURST = 5
+
+MAX_RETRIES = 5
+RETRY_BACKOFF = 2                       # seconds, doubled after every retry
+RETRY_STATUS_CODES = {429, 500, 503}
+
+# Role the users and groups of share_with get on a spreadsheet created on rollover
+ROLLOVER_SHARE_ROLE = "writer"
+
+
+class TokenBucket:
+    """
+    Token bucket pacing: tokens refill at rate per second up to capacity,
+    every request takes one token and waits for it if the bucket is empty.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_MINUTE / 60, capacity=REQUESTS_BURST,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+
+    def acquire(self, tokens=1):
+        while True:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # The tolerance absorbs float rounding of the refill after a sleep
+            if self.tokens >= tokens - 1e-9:
+                self.tokens = max(0.0, self.tokens - tokens)
+                return
+            self.sleep((tokens - self.tokens) / self.rate)
+
+
+class SheetsUploader:
+    """
+    Upload rows to new sheets of a spreadsheet in size-bounded chunks.
+    Each sheet is created with its grid sized for the rows it will hold, so no resize is
+    needed later, and the rows are written with values().batchUpdate calls paced by a
+    token bucket. 429/5xx responses are retried with exponential backoff. When the
+    spreadsheet's cell limit is near, the upload rolls over to a sheet titled
+    '<title> (2)', '<title> (3)', ... in a newly created spreadsheet, with the header repeated.
+    The new spreadsheet is owned by the service account, so it is shared through drive_service
+    with the share_with members, 'user:<email>' or 'group:<email>'; without them the rollover
+    raises instead of writing rows nobody can see.
+    """
+
+    def __init__(self, sheet_service, spreadsheet_id, bucket=None, sleep=time.sleep,
+                 chunk_max_bytes=CHUNK_MAX_BYTES, chunk_max_rows=CHUNK_MAX_ROWS,
+                 cell_limit=SPREADSHEET_CELL_LIMIT - CELL_LIMIT_MARGIN, drive_service=None, share_with=()):
+        self.sheet_service = sheet_service
+        self.spreadsheet_id = spreadsheet_id
+        self.drive_service = drive_service
+        self.share_with = [_permission(member) for member in share_with]
+        self.bucket = bucket or TokenBucket(sleep=sleep)
+        self.sleep = sleep
+        self.chunk_max_bytes = chunk_max_bytes
+        self.chunk_max_rows = chunk_max_rows
+        self.cell_limit = cell_limit
+
+    def upload(self, title, header, rows, row_count):
+        """
+        Write header and row_count rows to new sheets.
+        Returns the (spreadsheet id, sheet title) pairs written.
+        """
+        written_sheets = []
+        rows = iter(rows)
+        remaining = row_count
+        part = 1
+        rolled_over = False
+        while True:
+            column_count = len(header)
+            capacity = (self.cell_limit - self._used_cells()) // column_count - 1
+            if capacity <= 0:
+                if rolled_over:
+                    log.error(f"No room for rows in the new spreadsheet, {remaining} rows were not uploaded")
+                    return written_sheets
+                self._rollover(title, part)
+                rolled_over = True
+                continue
+            rolled_over = False
+
+            sheet_rows = min(capacity, remaining)
+            sheet_title = title if part == 1 else f"{title} ({part})"
+            self._add_sheet(sheet_title, sheet_rows + 1, column_count)
+            written_sheets.append((self.spreadsheet_id, sheet_title))
+
+            written = self._write(sheet_title, chain([header], islice(rows, sheet_rows)))
+            remaining -= written - 1
+            log.info(f"{written - 1} rows uploaded to sheet '{sheet_title}'")
+
+            # The row count may be an estimate, so check for leftovers too;
+            # up to a chunk of them is read ahead to size the next sheet
+            leftover = list(islice(rows, self.chunk_max_rows))
+            if not leftover:
+                return written_sheets
+            rows = chain(leftover, rows)
+            remaining = max(remaining, len(leftover))
+            part += 1
+
+    def _rollover(self, title, part):
+        """
+        Continue in a new spreadsheet, since the cell limit applies to a whole spreadsheet,
+        and share it with the share_with members.
+        """
+        if not self.share_with or self.drive_service is None:
+            raise RuntimeError(f"Spreadsheet '{self.spreadsheet_id}' is near its cell limit and a new spreadsheet "
+                               f"would not be shared with anyone; configure the users or groups to share it with")
+
+        spreadsheet = self._execute(self.sheet_service.create(
+            body={"properties": {"title": f"{title} ({part})"}},
+            fields="spreadsheetId"
+        ))
+        spreadsheet_id = spreadsheet["spreadsheetId"]
+        for permission in self.share_with:
+            self._execute(self.drive_service.permissions().create(
+                fileId=spreadsheet_id,
+                body=permission,
+                sendNotificationEmail=False,
+                fields="id"
+            ))
+        members = ", ".join(permission["emailAddress"] for permission in self.share_with)
+        log.warning(f"Spreadsheet '{self.spreadsheet_id}' is near its cell limit, "
+                    f"continuing in the new spreadsheet '{spreadsheet_id}' shared with {members}")
+        self.spreadsheet_id = spreadsheet_id
+
+    def _write(self, sheet_title, rows):
+        """
+        Write rows starting from A1 in chunks bounded by chunk_max_rows and chunk_max_bytes.
+        Returns the number of rows written.
+        """
+        start_row = 1
+        chunk = []
+        chunk_bytes = 0
+        for row in rows:
+            row_bytes = sum(len(str(value)) + 4 for value in row)
+            if chunk and (len(chunk) >= self.chunk_max_rows or chunk_bytes + row_bytes > self.chunk_max_bytes):
+                self._write_chunk(sheet_title, start_row, chunk)
+                start_row += len(chunk)
+                chunk = []
+                chunk_bytes = 0
+            chunk.append(row)
+            chunk_bytes += row_bytes
+
+        if chunk:
+            self._write_chunk(sheet_title, start_row, chunk)
+            start_row += len(chunk)
+        return start_row - 1
+
+    def _write_chunk(self, sheet_title, start_row, chunk):
+        self._execute(self.sheet_service.values().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={
+                "valueInputOption": "RAW",
+                "data": [{"range": f"{_quote(sheet_title)}!A{start_row}", "values": chunk}]
+            }
+        ))
+
+    def _add_sheet(self, sheet_title, row_count, column_count):
+        self._execute(self.sheet_service.batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={
+                "requests": [{
+                    "addSheet": {
+                        "properties": {
+                            "title": sheet_title,
+                            "index": 0,
+                            "gridProperties": {"rowCount": row_count, "columnCount": column_count}
+                        }
+                    }
+                }]
+            }
+        ))
+
+    def _used_cells(self):
+        spreadsheet = self._execute(self.sheet_service.get(
+            spreadsheetId=self.spreadsheet_id,
+            fields="sheets.properties.gridProperties"
+        ))
+        return sum(
+            sheet["properties"]["gridProperties"].get("rowCount", 0)
+            * sheet["properties"]["gridProperties"].get("columnCount", 0)
+            for sheet in spreadsheet.get("sheets", [])
+        )
+
+    def _execute(self, request):
+        from googleapiclient.errors import HttpError
+        delay = RETRY_BACKOFF
+        for retry_no in range(MAX_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                return request.execute()
+            except HttpError as e:
+                if e.resp.status not in RETRY_STATUS_CODES or retry_no == MAX_RETRIES:
+                    raise
+                wait = delay + random.uniform(0, delay)
+                log.warning(f"Google Sheets API returned {e.resp.status}, retry {retry_no + 1}/{MAX_RETRIES} in {wait:.1f}s")
+                self.sleep(wait)
+                delay *= 2
+
+
+def _permission(member):
+    # 'user:<email>' or 'group:<email>' to the body of a Drive permission
+    member_type, _, email = member.partition(":")
+    if member_type not in ("user", "group") or not email:
+        raise ValueError(f"Invalid member '{member}', expected 'user:<email>' or 'group:<email>'")
+    return {"type": member_type, "role": ROLLOVER_SHARE_ROLE, "emailAddress": email}
+
+
+def _quote(sheet_title):
+    # A1 notation: sheet titles are quoted, quotes inside are doubled
+    return "'" + sheet_title.replace("'", "''") + "'"
@@ -0,0 +1,191 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+from logger import get_general_logger
+
+log = get_general_logger(__name__)
+
+CACHE_DIR = "cache"
+CACHE_TTL = 7 * 24 * 60 * 60            # seconds an entry stays valid after it was written
+CACHE_MAX_BYTES = 2 * 1024 ** 3         # total size of the compressed entries
+CACHE_READ_CHUNK_SIZE = 64 * 1024
+CACHE_SUFFIX = ".json.gz"
+VALIDATORS_SUFFIX = ".validators.json"
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw API responses.
+    Every entry is a gzip-compressed response body stored under the hash of
+    (client, start, end). An entry's mtime is the time it was written and is used
+    for TTL expiry; its atime is bumped on every hit and is used for LRU eviction
+    once the cache grows over max_bytes.
+    The ETag/Last-Modified validators of the response are stored next to the entry,
+    so a later process can re-request the window conditionally (see fetcher.ApiClient).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(client, start, end):
+        return hashlib.sha256(f"{client}|{start}|{end}".encode("utf-8")).hexdigest()
+
+    def read(self, key, revalidated=False):
+        """
+        Return an iterator over the decompressed body bytes of the entry,
+        or None if there is no valid entry for the key.
+        Entries stored for revalidation (see tee) are only returned if revalidated is True,
+        i.e. after the server replied 304 Not Modified to a conditional request.
+        """
+        path = self._path(key)
+        stat = self._stat(path)
+        if stat is None:
+            return None
+        if not revalidated and self._read_validators(key).get("revalidate"):
+            return None
+
+        # Mark the entry as recently used, keeping its write time
+        os.utime(path, (time.time(), stat.st_mtime))
+        return self._iter_file(path)
+
+    def validators(self, key):
+        """
+        Return the (etag, last_modified) pair stored with a valid entry, or None.
+        """
+        if self._stat(self._path(key)) is None:
+            return None
+        validators = self._read_validators(key)
+        if not validators.get("etag") and not validators.get("last_modified"):
+            return None
+        return validators.get("etag"), validators.get("last_modified")
+
+    def revalidated(self, key, revalidate):
+        """
+        Restart the TTL of an entry the server confirmed as unchanged.
+        If revalidate is False, the entry is served without a request from now on.
+        """
+        now = time.time()
+        try:
+            os.utime(self._path(key), (now, now))
+        except FileNotFoundError:
+            return
+        validators = self._read_validators(key)
+        if validators.get("revalidate") != revalidate:
+            self._write_validators(key, {**validators, "revalidate": revalidate})
+
+    def tee(self, key, byte_chunks, etag=None, last_modified=None, revalidate=False):
+        """
+        Pass byte chunks through while writing them to a new entry.
+        The entry is only published once the chunks are exhausted, so an
+        interrupted or failed response never ends up in the cache.
+        The validators of the response are stored with the entry. If revalidate is True,
+        e.g. for a window that is still filling up upstream, the entry is only served
+        after a conditional request confirmed it (see read).
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        published = False
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                for chunk in byte_chunks:
+                    f.write(chunk)
+                    yield chunk
+            # An old entry's validators must not outlive its body
+            self._remove(self._validators_path(key))
+            os.replace(tmp_path, self._path(key))
+            published = True
+        finally:
+            if not published:
+                self._remove(tmp_path)
+
+        if etag or last_modified or revalidate:
+            self._write_validators(key, {"etag": etag, "last_modified": last_modified, "revalidate": revalidate})
+        self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used ones until the cache fits max_bytes.
+        """
+        now = time.time()
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove_entry(path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove_entry(path)
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def _validators_path(self, key):
+        return os.path.join(self.cache_dir, key + VALIDATORS_SUFFIX)
+
+    def _stat(self, path):
+        # Returns None if the entry doesn't exist or has expired
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if time.time() - stat.st_mtime > self.ttl:
+            self._remove_entry(path)
+            return None
+        return stat
+
+    def _read_validators(self, key):
+        try:
+            with open(self._validators_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read the validators of cache entry {key}:\n{e}")
+            return {}
+
+    def _write_validators(self, key, validators):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(validators, f)
+            os.replace(tmp_path, self._validators_path(key))
+        except OSError as e:
+            self._remove(tmp_path)
+            log.warning(f"Could not write the validators of cache entry {key}:\n{e}")
+
+    def _remove_entry(self, path):
+        self._remove(path)
+        self._remove(path[:-len(CACHE_SUFFIX)] + VALIDATORS_SUFFIX)
+
+    @staticmethod
+    def _iter_file(path):
+        with gzip.open(path, "rb") as f:
+            while chunk := f.read(CACHE_READ_CHUNK_SIZE):
+                yield chunk
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"Could not remove cache file {path}:\n{e}")
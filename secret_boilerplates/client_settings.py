@@ -3,4 +3,8 @@ CLIENT = ""
 CLIENT_KEY = ""
 
 EXPORT_SPREADSHEET_ID = ""
-REPORT_SPREADSHEET_ID = ""
\ No newline at end of file
+REPORT_SPREADSHEET_ID = ""
+
+# Users and groups the spreadsheets created when the export spreadsheet is full are shared with,
+# e.g. ["user:owner@example.com", "group:analysts@example.com"]
+ROLLOVER_SHARE_WITH = []
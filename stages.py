@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import namedtuple
+from logger import get_general_logger
+
+log = get_general_logger(__name__)
+
+# A stage is a function called without arguments; timeout is in seconds, None for no limit
+Stage = namedtuple("Stage", ["name", "func", "timeout"], defaults=[None])
+StageResult = namedtuple("StageResult", ["name", "ok", "seconds", "error"])
+
+
+def run_stages(stages):
+    """
+    Run independent stages concurrently, each on its own thread, and wait for all of them.
+    A stage that raises or exceeds its timeout is reported as failed without affecting the others.
+    Returns a StageResult per stage, in the order of stages.
+
+    Threads can't be stopped, so a stage that timed out keeps running in the background;
+    the threads are daemonic and don't keep the process alive.
+    """
+    runners = [_StageRunner(stage) for stage in stages]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join(runner.remaining())
+    return [runner.result() for runner in runners]
+
+
+def check_stages(results):
+    """
+    Raise RuntimeError naming the failed stages, if any.
+    """
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        raise RuntimeError(f"Stages failed: {', '.join(failed)}")
+
+
+class _StageRunner(threading.Thread):
+
+    def __init__(self, stage):
+        super().__init__(name=f"stage-{stage.name}", daemon=True)
+        self.stage = stage
+        self.started_at = None
+        self.seconds = None
+        self.error = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        super().start()
+
+    def remaining(self):
+        # Timeouts count from the start of the stage, not from the join
+        if self.stage.timeout is None:
+            return None
+        return max(0.0, self.started_at + self.stage.timeout - time.perf_counter())
+
+    def run(self):
+        log.info(f"Stage '{self.stage.name}' started")
+        try:
+            self.stage.func()
+        except Exception as e:
+            self.error = e
+        self.seconds = time.perf_counter() - self.started_at
+
+        if self.error is not None:
+            log.error(f"Stage '{self.stage.name}' failed after {self.seconds:.2f}s: {self.error!r}")
+        else:
+            log.info(f"Stage '{self.stage.name}' finished in {self.seconds:.2f}s")
+
+    def result(self):
+        if self.is_alive():
+            seconds = time.perf_counter() - self.started_at
+            log.error(f"Stage '{self.stage.name}' timed out after {seconds:.2f}s")
+            return StageResult(self.stage.name, False, seconds, TimeoutError(f"timed out after {self.stage.timeout}s"))
+        return StageResult(self.stage.name, self.error is None, self.seconds, self.error)
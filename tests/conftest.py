@@ -0,0 +1,27 @@
+import os
+import sys
+import types
+
+# The modules of the project are imported from the repository root, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The tests never use real credentials: secret/ (see secret_boilerplates) is replaced by a stub
+# before any project module imports it, and the database settings db/config.py reads
+# from secret/db_secrets.env default to a local test database.
+_client_settings = types.ModuleType("secret.client_settings")
+_client_settings.API_URL = "http://127.0.0.1/api"
+_client_settings.CLIENT = "test-client"
+_client_settings.CLIENT_KEY = "test-client-key"
+_client_settings.EXPORT_SPREADSHEET_ID = "test-export-spreadsheet"
+_client_settings.REPORT_SPREADSHEET_ID = "test-report-spreadsheet"
+_client_settings.ROLLOVER_SHARE_WITH = []
+
+_secret = types.ModuleType("secret")
+_secret.__path__ = []
+_secret.client_settings = _client_settings
+sys.modules["secret"] = _secret
+sys.modules["secret.client_settings"] = _client_settings
+
+for _name, _value in (("DB_NAME", "sml-assessment-hub-test"), ("DB_USER", "test"), ("DB_PASSWORD", "test"),
+                      ("DB_ADMIN_USER", "postgres"), ("DB_ADMIN_PASSWORD", "postgres")):
+    os.environ.setdefault(_name, _value)
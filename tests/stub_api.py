@@ -0,0 +1,121 @@
+import json
+import hashlib
+import time
+import random
+import threading
+import datetime as dt
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Every STUB_ITEM_INTERVAL seconds since the epoch the stub API has one attempt
+STUB_ITEM_INTERVAL = 10
+STUB_USERS = 200
+STUB_COURSES = ("SkillFactory+DST-3.0+28FEB2021", "SkillFactory+PYTHON-2.0+01MAR2021", "SkillFactory+SQL+01APR2021")
+
+_API_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def stub_item(timestamp):
+    """
+    Return the raw item the stub API has at timestamp (seconds since the epoch).
+    """
+    n = timestamp // STUB_ITEM_INTERVAL
+    user_id = f"user{n % STUB_USERS}"
+    course = STUB_COURSES[n % len(STUB_COURSES)]
+    passback = {
+        "oauth_consumer_key": "",
+        "lis_result_sourcedid": f"course-v1:{course}:lms.skillfactory.ru-target{n % 7}:{user_id}",
+        "lis_outcome_service_url": "https://lms.skillfactory.ru/courses/grade_handler",
+    }
+    return {
+        "lti_user_id": user_id,
+        "attempt_type": "submit" if n % 3 else "run",
+        "created_at": dt.datetime.fromtimestamp(timestamp, dt.timezone.utc).strftime(_API_TIME_FORMAT),
+        "is_correct": (n % 2 if n % 3 else None),
+        "passback_params": repr(passback),
+    }
+
+
+def stub_items(start_utc, end_utc):
+    """
+    Return the items of the window [start_utc, end_utc] in a shuffled order,
+    as the real API doesn't return them in created_at order.
+    """
+    first = -(-int(start_utc.timestamp()) // STUB_ITEM_INTERVAL) * STUB_ITEM_INTERVAL
+    items = [stub_item(timestamp) for timestamp in range(first, int(end_utc.timestamp()) + 1, STUB_ITEM_INTERVAL)
+             if start_utc.timestamp() <= timestamp <= end_utc.timestamp()]
+    random.Random(first).shuffle(items)
+    return items
+
+
+class StubApi:
+    """
+    Local HTTP server answering like the Simulative API, run in a background thread.
+    Every request waits latency seconds before the reply, to stand in for the upstream query time.
+    Replies carry an ETag, but conditional requests are answered in full.
+    Requests whose start is in failing_starts are answered with 500, only the first failures
+    times per start if failures is given.
+    """
+
+    def __init__(self, latency=0.0, failing_starts=(), failures=None):
+        self.latency = latency
+        self.failing_starts = set(failing_starts)
+        self.failures = failures
+        self._failed = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/attempts"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+                start_utc = _parse_time(params["start"])
+                end_utc = _parse_time(params["end"])
+                with api._lock:
+                    api.requests += 1
+                    failing = start_utc in api.failing_starts and (
+                        api.failures is None or api._failed.get(start_utc, 0) < api.failures)
+                    if failing:
+                        api._failed[start_utc] = api._failed.get(start_utc, 0) + 1
+                time.sleep(api.latency)
+
+                if failing:
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                body = json.dumps(stub_items(start_utc, end_utc)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _parse_time(value):
+    return dt.datetime.strptime(value, _API_TIME_FORMAT).replace(tzinfo=dt.timezone.utc)
@@ -0,0 +1,78 @@
+import datetime as dt
+import pytest
+import fetcher
+from response_cache import ResponseCache
+from stub_api import StubApi, stub_items
+
+START = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+END = START + dt.timedelta(days=2) - dt.timedelta(microseconds=1)
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    # No cached responses and no retry waits; every test counts its own requests
+    monkeypatch.setattr(fetcher, "CACHE_ENABLED", False)
+    monkeypatch.setattr(fetcher, "_client", fetcher.ApiClient(max_retries=0))
+
+
+def test_backfill_returns_the_window_in_created_at_order():
+    with StubApi() as api:
+        attempts = fetcher.get_data(api.url, START, END, chunk=dt.timedelta(hours=6), max_workers=4)
+
+    assert len(attempts) == len(stub_items(START, END))
+    assert [att.created_at for att in attempts] == sorted(att.created_at for att in attempts)
+    assert api.requests == 8
+
+
+def test_backfill_matches_single_request():
+    with StubApi() as api:
+        single = fetcher.get_data(api.url, START, END)
+        backfill = fetcher.get_data(api.url, START, END, chunk=dt.timedelta(hours=1), max_workers=4)
+
+    assert sorted(single, key=lambda att: att.created_at) == backfill
+
+
+def test_backfill_isolates_failed_chunk():
+    failing = START + dt.timedelta(hours=12)
+    failing_end = failing + dt.timedelta(hours=6) - dt.timedelta(microseconds=1)
+    with StubApi(failing_starts=[failing]) as api:
+        failed_windows = []
+        attempts = fetcher.get_data(api.url, START, END, chunk=dt.timedelta(hours=6),
+                                    failed_windows=failed_windows)
+
+    # The other chunks are still returned, the failed one leaves a gap and is reported
+    assert failed_windows == [(failing, failing_end)]
+    assert len(attempts) == len(stub_items(START, END)) - len(stub_items(failing, failing_end))
+    assert not any(failing <= att.created_at <= failing_end for att in attempts)
+    assert [att.created_at for att in attempts] == sorted(att.created_at for att in attempts)
+    # Only the failed chunk is fetched again
+    assert api.requests == 8 + fetcher.BACKFILL_CHUNK_RETRIES
+
+
+def test_backfill_retries_only_the_failed_chunk():
+    failing = START + dt.timedelta(hours=12)
+    with StubApi(failing_starts=[failing], failures=1) as api:
+        failed_windows = []
+        attempts = fetcher.get_data(api.url, START, END, chunk=dt.timedelta(hours=6),
+                                    failed_windows=failed_windows)
+
+    assert failed_windows == []
+    assert len(attempts) == len(stub_items(START, END))
+    assert api.requests == 9
+
+
+def test_only_settled_windows_are_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(fetcher, "CACHE_ENABLED", True)
+    monkeypatch.setattr(fetcher, "_cache", ResponseCache(str(tmp_path)))
+    now = dt.datetime.now(dt.timezone.utc)
+    with StubApi() as api:
+        # A window that ends now, like every sync window, is fetched again by every run
+        fetcher.get_data(api.url, now - dt.timedelta(hours=1), now)
+        fetcher.get_data(api.url, now - dt.timedelta(hours=1), now)
+        assert api.requests == 2
+        assert list(tmp_path.iterdir()) == []
+
+        # A settled window is served from the cache the second time
+        settled = fetcher.get_data(api.url, START, START + dt.timedelta(hours=1))
+        assert fetcher.get_data(api.url, START, START + dt.timedelta(hours=1)) == settled
+        assert api.requests == 3
@@ -0,0 +1,34 @@
+import json
+import pytest
+from fetcher import iter_json_array
+
+PAYLOAD = ' [15000000000.0, -3, 2.5e-3, 1E+2, 0, true, null, "a,]\\"b", "äöü €", {"k": [1, {"n": -0.5}]}, [], {}] '
+
+
+def split_at(data, *positions):
+    bounds = [0, *positions, len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("position", range(len(PAYLOAD.encode("utf-8")) + 1))
+def test_items_are_parsed_whatever_the_chunk_boundary(position):
+    data = PAYLOAD.encode("utf-8")
+    assert list(iter_json_array(split_at(data, position))) == json.loads(PAYLOAD)
+
+
+def test_items_are_parsed_from_single_byte_chunks():
+    data = PAYLOAD.encode("utf-8")
+    assert list(iter_json_array(split_at(data, *range(1, len(data))))) == json.loads(PAYLOAD)
+
+
+@pytest.mark.parametrize("payload", ["[]", " [ ] ", "[1]", "[-1]", '[""]'])
+def test_small_arrays(payload):
+    assert list(iter_json_array([payload.encode("utf-8")])) == json.loads(payload)
+
+
+@pytest.mark.parametrize("payload", ["", "{}", "[1,", "[1 2]", "[1] 2", "[15000000000.", "[1x]"])
+def test_invalid_input_raises(payload):
+    data = payload.encode("utf-8")
+    for position in range(len(data) + 1):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(split_at(data, position)))
@@ -0,0 +1,30 @@
+import json
+from db.loader import _jsonb_text
+
+NUL_ITEM = {
+    "lti_user_id": "user\x001",
+    "attempt_type": "submit",
+    "created_at": "2026-01-01 00:00:00.000000",
+    "is_correct": None,
+    "passback_params": ["\x00", {"key\x00": "value"}],
+}
+
+
+def test_nul_characters_are_escaped_for_jsonb():
+    text = _jsonb_text(NUL_ITEM)
+
+    # PostgreSQL rejects the \u0000 escape in JSONB input; a literal '\u0000' string is accepted
+    assert "\x00" not in text
+    assert "\\u0000" not in text.replace("\\\\u0000", "")
+    assert json.loads(text) == {
+        "lti_user_id": "user\\u00001",
+        "attempt_type": "submit",
+        "created_at": "2026-01-01 00:00:00.000000",
+        "is_correct": None,
+        "passback_params": ["\\u0000", {"key\\u0000": "value"}],
+    }
+
+
+def test_items_without_nul_characters_are_stored_unchanged():
+    item = {"lti_user_id": "user1", "passback_params": "{'oauth_consumer_key': '\\\\u0000'}"}
+    assert json.loads(_jsonb_text(item)) == item
@@ -0,0 +1,254 @@
+import pytest
+from httplib2 import Response
+from googleapiclient.errors import HttpError
+from reports.uploader import SheetsUploader, TokenBucket
+
+HEADER = ["user_id", "created_at", "course", "attempt_type"]
+
+
+class FakeClock:
+    """
+    Clock whose sleep only moves the time forward.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeSheets:
+    """
+    In-memory stand-in for the spreadsheets() resource of the Sheets API.
+    Keeps the grid size and the written rows of every sheet, and the time and name of every call.
+    The first failures calls to values().batchUpdate fail with HTTP status failure_status.
+    """
+
+    def __init__(self, clock, failures=0, failure_status=429):
+        self.clock = clock
+        self.failures = failures
+        self.failure_status = failure_status
+        self.spreadsheets = {"spreadsheet-1": {}}
+        self.calls = []
+
+    def create(self, body, fields):
+        return _Request(self, "create", self._create, body)
+
+    def get(self, spreadsheetId, fields):
+        return _Request(self, "get", self._get, spreadsheetId)
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self, "batchUpdate", self._add_sheets, spreadsheetId, body)
+
+    def values(self):
+        return _Values(self)
+
+    def value_writes(self):
+        return [name for _, name in self.calls if name == "values.batchUpdate"]
+
+    def rows(self, spreadsheet_id, sheet_title):
+        sheet = self.spreadsheets[spreadsheet_id][sheet_title]
+        return [sheet["rows"][row_no] for row_no in sorted(sheet["rows"])]
+
+    def _create(self, body):
+        spreadsheet_id = f"spreadsheet-{len(self.spreadsheets) + 1}"
+        self.spreadsheets[spreadsheet_id] = {}
+        return {"spreadsheetId": spreadsheet_id}
+
+    def _get(self, spreadsheet_id):
+        return {"sheets": [{"properties": {"gridProperties": {"rowCount": sheet["row_count"],
+                                                              "columnCount": sheet["column_count"]}}}
+                           for sheet in self.spreadsheets[spreadsheet_id].values()]}
+
+    def _add_sheets(self, spreadsheet_id, body):
+        for request in body["requests"]:
+            properties = request["addSheet"]["properties"]
+            self.spreadsheets[spreadsheet_id][properties["title"]] = {
+                "row_count": properties["gridProperties"]["rowCount"],
+                "column_count": properties["gridProperties"]["columnCount"],
+                "rows": {},
+            }
+        return {}
+
+    def _write_values(self, spreadsheet_id, body):
+        if self.failures:
+            self.failures -= 1
+            raise HttpError(Response({"status": self.failure_status}), b"")
+        for data in body["data"]:
+            quoted_title, start = data["range"].rsplit("!A", 1)
+            sheet = self.spreadsheets[spreadsheet_id][quoted_title[1:-1].replace("''", "'")]
+            for row_no, row in enumerate(data["values"], int(start)):
+                assert row_no <= sheet["row_count"], "write outside of the sheet grid"
+                sheet["rows"][row_no] = row
+        return {}
+
+
+class FakeDrive:
+    """
+    In-memory stand-in for the Drive API service; keeps the permissions created per file.
+    """
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+        self.permissions_by_file = {}
+
+    def permissions(self):
+        return _Permissions(self)
+
+    def _create_permission(self, file_id, body):
+        self.permissions_by_file.setdefault(file_id, []).append(body)
+        return {"id": f"permission-{len(self.permissions_by_file[file_id])}"}
+
+
+class _Permissions:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def create(self, fileId, body, sendNotificationEmail, fields):
+        return _Request(self.drive.sheets, "permissions.create", self.drive._create_permission, fileId, body)
+
+
+class _Values:
+    def __init__(self, service):
+        self.service = service
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self.service, "values.batchUpdate", self.service._write_values, spreadsheetId, body)
+
+
+class _Request:
+    def __init__(self, service, name, handler, *args):
+        self.service = service
+        self.name = name
+        self.handler = handler
+        self.args = args
+
+    def execute(self):
+        self.service.calls.append((self.service.clock(), self.name))
+        return self.handler(*self.args)
+
+
+def make_rows(count):
+    return [[f"user{n}", f"2026-01-01 00:00:{n % 60:02d}", "DST-3.0", "submit"] for n in range(count)]
+
+
+def make_uploader(service, clock, **kwargs):
+    bucket = TokenBucket(rate=1, capacity=5, clock=clock, sleep=clock.sleep)
+    return SheetsUploader(service, "spreadsheet-1", bucket=bucket, sleep=clock.sleep, **kwargs)
+
+
+def test_rows_are_written_in_bounded_chunks():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(2500)
+
+    sheets = make_uploader(service, clock, chunk_max_rows=1000).upload("Attempts", HEADER, rows, len(rows))
+
+    assert sheets == [("spreadsheet-1", "Attempts")]
+    assert service.rows("spreadsheet-1", "Attempts") == [HEADER] + rows
+    # 2501 rows with the header: 1000 + 1000 + 501
+    assert len(service.value_writes()) == 3
+
+
+def test_chunks_are_bounded_by_bytes():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(1000)
+    row_bytes = sum(len(str(value)) + 4 for value in rows[0])
+
+    make_uploader(service, clock, chunk_max_bytes=100 * row_bytes).upload("Attempts", HEADER, rows, len(rows))
+
+    assert service.rows("spreadsheet-1", "Attempts") == [HEADER] + rows
+    assert len(service.value_writes()) == 11
+
+
+def test_upload_rolls_over_to_new_spreadsheets_near_the_cell_limit():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(600)
+
+    drive = FakeDrive(service)
+    share_with = ["user:owner@example.com", "group:analysts@example.com"]
+
+    # 1000 cells of 4 columns fit the header and 249 rows per spreadsheet
+    sheets = make_uploader(service, clock, cell_limit=1000, drive_service=drive,
+                           share_with=share_with).upload("Attempts", HEADER, rows, len(rows))
+
+    assert sheets == [("spreadsheet-1", "Attempts"), ("spreadsheet-2", "Attempts (2)"),
+                      ("spreadsheet-3", "Attempts (3)")]
+    uploaded = []
+    for spreadsheet_id, sheet_title in sheets:
+        sheet_rows = service.rows(spreadsheet_id, sheet_title)
+        assert sheet_rows[0] == HEADER
+        uploaded.extend(sheet_rows[1:])
+    assert uploaded == rows
+
+    # Every new spreadsheet is shared, without notification emails
+    expected = [{"type": "user", "role": "writer", "emailAddress": "owner@example.com"},
+                {"type": "group", "role": "writer", "emailAddress": "analysts@example.com"}]
+    assert drive.permissions_by_file == {"spreadsheet-2": expected, "spreadsheet-3": expected}
+
+
+def test_rollover_without_members_to_share_with_raises():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(300)
+
+    with pytest.raises(RuntimeError, match="would not be shared"):
+        make_uploader(service, clock, cell_limit=1000, drive_service=FakeDrive(service)).upload(
+            "Attempts", HEADER, rows, len(rows))
+
+    # No spreadsheet is created that only the service account could open
+    assert list(service.spreadsheets) == ["spreadsheet-1"]
+
+
+def test_leftover_rows_of_an_underestimated_count_are_uploaded():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(300)
+
+    sheets = make_uploader(service, clock).upload("Attempts", HEADER, iter(rows), 200)
+
+    assert sheets == [("spreadsheet-1", "Attempts"), ("spreadsheet-1", "Attempts (2)")]
+    assert service.rows("spreadsheet-1", "Attempts")[1:] + service.rows("spreadsheet-1", "Attempts (2)")[1:] == rows
+
+
+def test_requests_are_paced_by_the_token_bucket():
+    clock = FakeClock()
+    service = FakeSheets(clock)
+    rows = make_rows(2000)
+
+    make_uploader(service, clock, chunk_max_rows=100).upload("Attempts", HEADER, rows, len(rows))
+
+    # get + addSheet + 21 writes: a burst of 5, then one request per second
+    times = [call_time for call_time, _ in service.calls]
+    assert len(times) == 23
+    for call_no, call_time in enumerate(times):
+        assert call_time >= max(0, call_no - 4) - 1e-6
+    assert clock.now == pytest.approx(18)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_quota_and_unavailable_errors_are_retried(status):
+    clock = FakeClock()
+    service = FakeSheets(clock, failures=2, failure_status=status)
+    rows = make_rows(100)
+
+    make_uploader(service, clock).upload("Attempts", HEADER, rows, len(rows))
+
+    assert service.rows("spreadsheet-1", "Attempts") == [HEADER] + rows
+    assert len(service.value_writes()) == 3
+    # Backoff of 2-4s, then 4-8s, on top of the pacing
+    assert clock.now >= 6
+
+
+def test_other_errors_are_raised():
+    clock = FakeClock()
+    service = FakeSheets(clock, failures=1, failure_status=400)
+
+    with pytest.raises(HttpError):
+        make_uploader(service, clock).upload("Attempts", HEADER, make_rows(10), 10)